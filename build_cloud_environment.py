@@ -5,68 +5,41 @@
 # https://github.com/joao8tunes
 
 from pathlib import Path
+from typing import List, Optional
+import argparse
+import hashlib
 import logging
-import shutil
+import json
 import yaml
-import os
 
 from cloud_source.system_settings import setup_logging, get_settings
-from cloud_source.utils import validate_rfc1123_label, list_files, copy_file, create_temp_file, execute_command
+from cloud_source.utils import write_if_changed
+from cloud_source.manifests import (
+    BUILD_CACHE_FILENAME, validate_app_settings, build_replacements, replace_placeholders, render_manifests,
+    get_config_files, load_build_cache, save_build_cache
+)
+from cloud_source.templates import load_template, find_unused_replacements
+from cloud_source.provisioning import build_provisioning_plan, run_plan
+from cloud_source.images import render_docker_files, benchmark_docker_build
+from cloud_source.scaffold import scaffold_project
+from cloud_source.sizing import (
+    PROFILE_FILENAME, profile_app, write_sizing_profile, resolve_profile_filepath, load_sizing_profile,
+    apply_sizing_profile
+)
+from cloud_source.fleet import read_app_specs, build_fleet
 
 setup_logging(__name__)
 
 
-def replace_placeholders(text: str, replacements: dict) -> str:
+def build_cloud_environment(app_type: str, **kwargs) -> Optional[List[Path]]:
     """
-    Replace placeholders in the text with corresponding values from the replacements dictionary.
-
-    Parameters
-    ----------
-    text : str
-        The input text containing placeholders.
-    replacements : dict
-        Dictionary where keys are placeholders and values are their replacements.
-
-    Returns
-    -------
-    str
-        The text with placeholders replaced by actual values.
-    """
-    for placeholder, value in replacements.items():
-        text = text.replace(placeholder, value)
-
-    return text
-
-
-def generate_config_file(source_filepath: str, target_filepath: str, replacements: dict) -> None:
-    """
-    Generate a configuration file by replacing placeholders in the source file with actual values.
-
-    Parameters
-    ----------
-    source_filepath : str
-        Path to the source file with placeholders.
-    target_filepath : str
-        Path where the generated file will be saved.
-    replacements : dict
-        Dictionary of placeholders and their replacement values.
-    """
-    with open(source_filepath, mode="r") as file:
-        content = file.read()
-
-    content = replace_placeholders(content, replacements)
-    target_dir = os.path.dirname(target_filepath)
-
-    if target_dir:
-        os.makedirs(target_dir, exist_ok=True)
-
-    with open(target_filepath, mode="w") as file:
-        file.write(content)
+    Build the cloud environment by copying templates and configuring settings.
 
+    Builds are incremental: cloud resources are only provisioned again if the provisioning commands change, and
+    only manifests whose template or replacement values change are written.
 
-def build_cloud_environment(app_type: str, **kwargs) -> None:
-    """
-    Build the cloud environment by copying templates and configuring settings.
+    The resources and autoscaling targets recommended by the sizing profile of the app, if any, override the
+    settings (see `size_resources`).
 
     Parameters
     ----------
@@ -74,133 +47,56 @@ def build_cloud_environment(app_type: str, **kwargs) -> None:
         The type of template to be used ('LocalApp' or 'ServiceAPI').
     kwargs : dict
         Additional arguments for placeholder replacements.
+
+    Returns
+    -------
+    Optional[List[Path]]
+        Paths of the manifests that changed, or None if the build failed.
     """
     logging.info("Building cloud environment...")
 
-    project_id = kwargs.get('project_id', "")
-    gke_cluster_name = kwargs.get('gke_cluster_name', "")
-    gke_cluster_region = kwargs.get('gke_cluster_region', "")
-    repo_name = kwargs.get('repo_name', "")
-    app_name = kwargs.get('app_name', "")
-
-    assert (
-            validate_rfc1123_label(project_id)
-            and validate_rfc1123_label(gke_cluster_name)
-            and validate_rfc1123_label(gke_cluster_region)
-            and repo_name
-            and validate_rfc1123_label(app_name)
-    ), (
-        f"Invalid RFC 1123 label(s): "
-        f"{'project_id ' if not validate_rfc1123_label(project_id) else ''}"
-        f"{'gke_cluster_name ' if not validate_rfc1123_label(gke_cluster_name) else ''}"
-        f"{'gke_cluster_region ' if not validate_rfc1123_label(gke_cluster_region) else ''}"
-        f"{'app_name ' if not validate_rfc1123_label(app_name) else ''}"
-    ).strip()
-
-    iam_service_account_name = kwargs.get('iam_service_account_name', app_name + "-iam-sa")
-    gke_service_account_name = kwargs.get('gke_service_account_name', app_name + "-gke-sa")
-    gke_namespace = kwargs.get('gke_namespace', "default")
-    app_title = kwargs.get('app_title', app_name)
-    app_description = kwargs.get('app_description', app_name)
-    app_version = kwargs.get('app_version', "1.0.0")
-    deployment_name = app_name
-    hpa_name = app_name + "-hpa"
-    service_name = app_name + "-service"
-    certificate_name = app_name + "-certificate"
-    tls_name = app_name + "-tls"
-    ingress_name = app_name + "-ingress"
-    trigger_name = app_name + "-trigger"
-    ip_name = app_name + "-ip"
-
-    replacements = {
-        '<VAR_PROJECT_ID>': project_id,
-        '<VAR_IAM_SERVICE_ACCOUNT_NAME>': iam_service_account_name,
-        '<VAR_GKE_CLUSTER_NAME>': gke_cluster_name,
-        '<VAR_GKE_CLUSTER_REGION>': gke_cluster_region,
-        '<VAR_GKE_SERVICE_ACCOUNT_NAME>': gke_service_account_name,
-        '<VAR_GKE_NAMESPACE>': gke_namespace,
-        '<VAR_REPO_NAME>': repo_name,
-        '<VAR_APP_NAME>': app_name,
-        '<VAR_APP_TITLE>': app_title,
-        '<VAR_APP_DESCRIPTION>': app_description,
-        '<VAR_APP_VERSION>': app_version,
-        '<VAR_DEPLOY_NAME>': app_name,
-        '<VAR_HPA_NAME>': hpa_name,
-        '<VAR_SERVICE_NAME>': service_name,
-        '<VAR_CERT_NAME>': certificate_name,
-        '<VAR_TLS_NAME>': tls_name,
-        '<VAR_INGRESS_NAME>': ingress_name,
-        '<VAR_TRIGGER_NAME>': trigger_name,
-        '<VAR_IP_NAME>': ip_name
-    }
-
-    app_info = {
-        'project_id': project_id,
-        'gke_cluster_name': gke_cluster_name,
-        'gke_cluster_region': gke_cluster_region,
-        'repo_name': repo_name,
-        'app_name': app_name,
-        'iam_service_account_name': iam_service_account_name,
-        'gke_service_account_name': gke_service_account_name,
-        'gke_namespace': gke_namespace,
-        'app_title': app_title,
-        'app_description': app_description,
-        'app_version': app_version,
-        'deployment_name': deployment_name,
-        'hpa_name': hpa_name,
-        'trigger_name': trigger_name
-    }
-
     cwd = Path(__file__).resolve().parent
+    profile = load_sizing_profile(resolve_profile_filepath(kwargs.pop('sizing_profile', PROFILE_FILENAME)))
+
+    if profile:
+        logging.info("Applying the recommendations of the sizing profile...")
+        kwargs = apply_sizing_profile(kwargs, profile)
+
+    errors = validate_app_settings(app_type, **kwargs)
+    assert not errors, "; ".join(errors)
+
+    replacements, app_info = build_replacements(app_type, **kwargs)
+
+    cache_filepath = cwd / BUILD_CACHE_FILENAME
+    cache = load_build_cache(cache_filepath)
+
+    steps = build_provisioning_plan(app_type, replacements)
+    provisioning_key = hashlib.sha256(json.dumps([step.command for step in steps]).encode()).hexdigest()
+    provisioning_cache = cache.get('provisioning') or {}
+
+    if provisioning_cache.get('key') == provisioning_key:
+        logging.info("Cloud resources are up to date, skipping provisioning.")
+        static_ip_address = provisioning_cache.get('static_ip')
+    else:
+        logging.debug("Provisioning cloud resources...")
+        provisioning_settings = get_settings().get('provisioning') or {}
+        results = run_plan(
+            steps,
+            max_parallel=provisioning_settings.get('max_parallel_steps', 4),
+            retries=provisioning_settings.get('retries', 2),
+            retry_delay=provisioning_settings.get('retry_delay', 2.0)
+        )
+        static_ip_address = results['fetch-static-ip'].output if 'fetch-static-ip' in results else None
+
+        if all(result.succeeded for result in results.values()):
+            cache['provisioning'] = {'key': provisioning_key, 'static_ip': static_ip_address}
+        else:
+            cache.pop('provisioning', None)
 
-    try:
-        shutil.rmtree(cwd / "kubernetes", ignore_errors=True)
-        os.unlink(Path("cloudbuild.yaml"))
-        os.unlink(Path("app_info.yaml"))
-    except:
-        pass
-
-    # Define config file paths
-    config_files = {
-        'cloudbuild.yaml': {
-            'source': cwd / "cloud_assets" / "cloud_templates" / f"{app_type}_cloudbuild.yaml",
-            'target': Path("cloudbuild.yaml")
-        },
-        'deployment.yaml': {
-            'source': cwd / "cloud_assets" / "cloud_templates" / f"{app_type}_deployment.yaml",
-            'target': cwd / "kubernetes" / "deployment.yaml"
-        },
-        'hpa.yaml': {
-            'source': cwd / "cloud_assets" / "cloud_templates" / f"{app_type}_hpa.yaml",
-            'target': cwd / "kubernetes" / "hpa.yaml"
-        },
-    }
-
-    # Additional files for API template
     if app_type == "ServiceAPI":
-        app_info['service_name'] = service_name
-        app_info['certificate_name'] = certificate_name
-        app_info['tls_name'] = tls_name
-        app_info['ingress_name'] = ingress_name
-        app_info['ip_name'] = ip_name
-
-        create_ip_command = \
-            "gcloud compute addresses create <VAR_IP_NAME> --region=<VAR_GKE_CLUSTER_REGION>"
-        fetch_ip_command = \
-            ("gcloud compute addresses describe <VAR_IP_NAME> "
-             "--region=<VAR_GKE_CLUSTER_REGION> --format=\"get(address)\"")
-
-        create_ip_command = replace_placeholders(create_ip_command, replacements)
-        fetch_ip_command = replace_placeholders(fetch_ip_command, replacements)
-
-        logging.debug("Creating static IP...")
-        execute_command(create_ip_command)
-
-        logging.debug("Fetching static IP...")
-        static_ip_address = execute_command(fetch_ip_command)
-
         if not static_ip_address:
             logging.error("Failed to fetch static IP address.")
+            save_build_cache(cache_filepath, cache)
             return
 
         replacements['<VAR_STATIC_IP>'] = static_ip_address
@@ -208,49 +104,36 @@ def build_cloud_environment(app_type: str, **kwargs) -> None:
         app_info['ip_address'] = static_ip_address
         app_info['endpoint_url'] = endpoint_url
 
-        # Add API-specific configuration files
-        config_files.update({
-            'endpoint.yaml': {
-                'source': cwd / "cloud_assets" / "cloud_templates" / "ServiceAPI_endpoint.yaml",
-                'target': cwd / "kubernetes" / "endpoint.yaml"
-            },
-            'certificate.yaml': {
-                'source': cwd / "cloud_assets" / "cloud_templates" / "ServiceAPI_certificate.yaml",
-                'target': cwd / "kubernetes" / "certificate.yaml"
-            },
-            'service.yaml': {
-                'source': cwd / "cloud_assets" / "cloud_templates" / "ServiceAPI_service.yaml",
-                'target': cwd / "kubernetes" / "service.yaml"
-            },
-            'ingress.yaml': {
-                'source': cwd / "cloud_assets" / "cloud_templates" / "ServiceAPI_ingress.yaml",
-                'target': cwd / "kubernetes" / "ingress.yaml"
-            }
-        })
-
-    # Generate configuration files
-    for config_name, paths in config_files.items():
-        logging.debug(f"Generating '{config_name}' manifest file...")
-        generate_config_file(paths['source'], paths['target'], replacements)
-
-    logging.debug("Generating shell script file to apply cloud manifests...")
-    source_file = cwd / "cloud_assets" / "cloud_templates" / "apply_cloud_manifests.sh"
-    target_file = create_temp_file("apply_cloud_manifests.sh")
-    generate_config_file(source_file, target_file, replacements)
-
-    logging.debug("Applying cloud manifests...")
-    command = f"{target_file}"
-    execute_command(command)
-    os.remove(target_file)
-
-    with open("app_info.yaml", mode="w") as file:
-        yaml.dump(app_info, file, default_flow_style=False, sort_keys=False)
+    changed_manifests = render_manifests(
+        app_type, replacements, cwd, cache=cache, pod_monitoring=app_info['pod_monitoring']
+    )
+    unused = find_unused_replacements(
+        [step.placeholders for step in steps]
+        + [load_template(paths['source']).placeholders for paths in get_config_files(app_type, cwd, app_info['pod_monitoring']).values()],
+        replacements
+    )
+
+    if unused:
+        logging.debug(f"Unused replacement(s): {', '.join(sorted(unused))}")
+
+    if changed_manifests:
+        logging.info(
+            "Changed manifest(s), applied by the Cloud Build pipeline on the next push: "
+            + ", ".join(str(path.relative_to(cwd)) for path in changed_manifests)
+        )
+    else:
+        logging.info("Manifests are up to date.")
+
+    write_if_changed("app_info.yaml", yaml.dump(app_info, default_flow_style=False, sort_keys=False))
+    save_build_cache(cache_filepath, cache)
+
+    return changed_manifests
 
 
 def build_base_project(app_type: str) -> None:
     """
-    Build base project by copying templates based on the specified type.
-    Removes old source files before copying new ones.
+    Build base project by copying templates based on the specified type, and render its Docker files.
+    Only files that differ from the template are copied, and files of the other templates are removed.
 
     Parameters
     ----------
@@ -268,39 +151,111 @@ def build_base_project(app_type: str) -> None:
         "ServiceAPI": cwd / "cloud_assets" / "source_templates" / "ServiceAPI",
     }
 
-    # List and map target files
-    old_source_files = []
+    counts = scaffold_project(
+        source_dirs[app_type], target_dir,
+        stale_template_dirs=[source_dir for key, source_dir in source_dirs.items() if key != app_type]
+    )
 
-    for key, source_dir in source_dirs.items():
-        source_files = list_files(str(source_dir))
-        target_files = [Path(file.replace(str(source_dir), str(target_dir))) for file in source_files]
-        old_source_files.extend(target_files)
+    if counts['failed']:
+        logging.error(f"Failed to scaffold {counts['failed']} file(s) of the base project.")
 
-    # Remove old source files
-    for filepath in old_source_files:
-        if filepath.exists():
-            try:
-                filepath.unlink()
-            except IOError as e:
-                logging.error(f"An error occurred while deleting file {filepath}: {e}")
+    render_docker_files(app_type, target_dir, get_settings().get('docker'))
 
-    # Copy new source files
-    source_dir = cwd / "cloud_assets" / "source_templates" / app_type
-    source_files = list_files(str(source_dir))
-    target_files = [Path(file.replace(str(source_dir), str(target_dir))) for file in source_files]
 
-    for source, target in zip(source_files, target_files):
-        try:
-            target.parent.mkdir(parents=True, exist_ok=True)
-            copy_file(source, str(target))
-        except IOError as e:
-            logging.error(f"An error occurred while copying file {source} to {target}: {e}")
+def size_resources(duration: float = 60.0) -> Optional[dict]:
+    """
+    Profile the base project locally under load, and write its sizing profile with the recommended resources and
+    autoscaling targets, rendered into the manifests by the next build of the cloud environment.
+
+    Parameters
+    ----------
+    duration : float
+        Measurement duration, in seconds.
+
+    Returns
+    -------
+    Optional[dict]
+        Sizing profile, or None if there is no base project.
+    """
+    cwd = Path(__file__).resolve().parent
+
+    if (cwd / "gunicorn.conf.py").exists():
+        app_type = "ServiceAPI"
+    elif (cwd / "run.py").exists():
+        app_type = "LocalApp"
+    else:
+        logging.error("No base project found, create one before sizing its resources.")
+        return
+
+    profile = profile_app(app_type, cwd, duration=duration)
+    write_sizing_profile(cwd / PROFILE_FILENAME, profile)
+    logging.info(f"Sizing profile written to '{PROFILE_FILENAME}'.")
+
+    return profile
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command line arguments.
+
+    Returns
+    -------
+    argparse.Namespace
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Build GKE cloud environments and base projects.")
+    parser.add_argument(
+        "--fleet", metavar="SPECS_FILE",
+        help="Non-interactive mode: render the manifests of every app spec in a YAML/JSONL file."
+    )
+    parser.add_argument(
+        "--output-dir", default="fleet",
+        help="Output directory of the fleet mode (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes of the fleet mode (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--benchmark-docker", action="store_true",
+        help="Build the Docker image of the base project locally, and report the build times and image size."
+    )
+    parser.add_argument(
+        "--size-resources", action="store_true",
+        help="Profile the base project locally under load, and write the recommended resources to its sizing profile."
+    )
+    parser.add_argument(
+        "--sizing-duration", type=float, default=60.0,
+        help="Measurement duration in seconds of the resource sizing (default: %(default)s)."
+    )
+
+    return parser.parse_args()
 
 
 def main() -> None:
     """
     Main function to build Cloud environment and create a base project.
     """
+    args = parse_args()
+
+    if args.size_resources:
+        size_resources(args.sizing_duration)
+
+        return
+
+    if args.benchmark_docker:
+        results = benchmark_docker_build(Path(__file__).resolve().parent)
+        print(json.dumps(results, indent=2))
+
+        return
+
+    if args.fleet:
+        settings = get_settings()
+        specs = read_app_specs(args.fleet, defaults=settings.get('cloud'))
+        build_fleet(specs, args.output_dir, max_workers=args.workers)
+
+        return
+
     print("Choose the type of application you want to deploy:")
     print("  [1] LocalApp: A local application that runs as a script without exposing an API;")
     print("  [2] ServiceAPI: An API service that can be accessed over the network.")
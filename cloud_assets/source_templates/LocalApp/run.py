@@ -4,11 +4,41 @@
 # João Antunes <joao8tunes@gmail.com>
 # https://github.com/joao8tunes
 
-from source.system_settings import setup_logging
-from source.app import hello_world
+import argparse
+
+from source.system_settings import setup_logging, get_settings
+from source.utils import report_import_time
+from source.scheduler import create_scheduler
+from source.metrics import init_metrics
+from source.app import hello_world, process_messages
 
 setup_logging(__name__)
 
+# Functions of the jobs of the `scheduler` block of `settings.yaml`, by name
+JOBS = {
+    'hello_world': hello_world
+}
+
 
 if __name__ == '__main__':
-    hello_world()
+    parser = argparse.ArgumentParser(description="Run the local application.")
+    parser.add_argument("--import-time", action="store_true", help="Print a startup import time report and exit.")
+    args = parser.parse_args()
+
+    if args.import_time:
+        report_import_time("run")
+    else:
+        # Served in both modes, so the PodMonitoring of the deployment always finds the endpoint
+        init_metrics((get_settings().get('metrics') or {}).get('port', 9090))
+        consumer_settings = get_settings().get('consumer') or {}
+
+        if consumer_settings.get('enabled', False):
+            # Imported here, so the scheduler mode does not need the consumer dependencies
+            from source.consumer import create_consumer
+
+            runner = create_consumer(consumer_settings, process_messages)
+        else:
+            runner = create_scheduler(get_settings().get('scheduler') or {}, JOBS)
+
+        runner.install_signal_handlers()
+        runner.run()
@@ -4,22 +4,22 @@
 # João Antunes <joao8tunes@gmail.com>
 # https://github.com/joao8tunes
 
+from typing import List
 import logging
-import time
 
 from source.system_settings import setup_logging
+from source.queues import Message
 
 
 setup_logging(__name__)
 
 
-def hello_world():
+def hello_world() -> None:
     """
-    Continuously prints 'Hello World!' to the console every n seconds.
+    Prints 'Hello World!' to the console.
 
-    This function runs an infinite loop that prints 'Hello World!' to the
-    console and then sleeps for n seconds. This function does not return
-    any value and will keep running indefinitely until interrupted.
+    This function is run periodically by the scheduler (see `run.py` and the `scheduler` block of `settings.yaml`),
+    at a fixed rate regardless of how long each run takes.
 
     Parameters
     ----------
@@ -29,11 +29,35 @@ def hello_world():
     -------
     None
     """
-    while True:
-        message = "Hello World!"
-        waiting_time = 60
-
-        print(message)
-        logging.info(message)
-        logging.debug(f"Waiting {waiting_time} seconds before running again...")
-        time.sleep(waiting_time)
+    message = "Hello World!"
+
+    print(message)
+    logging.info(message)
+
+
+def process_messages(messages: List[Message]) -> List[str]:
+    """
+    Prints the payload of each message of a batch to the console.
+
+    This function is called by the consumer (see `run.py` and the `consumer` block of `settings.yaml`) with batches
+    of messages pulled from the queue, possibly from several threads at the same time.
+
+    Parameters
+    ----------
+    messages : List[Message]
+        Batch of messages.
+
+    Returns
+    -------
+    List[str]
+        IDs of the messages that failed to be processed, to be delivered again. The other messages are acknowledged.
+    """
+    failed_ids = []
+
+    for message in messages:
+        try:
+            logging.info(f"Message {message.id}: {message.data.decode('utf-8')}")
+        except UnicodeDecodeError:
+            failed_ids.append(message.id)
+
+    return failed_ids
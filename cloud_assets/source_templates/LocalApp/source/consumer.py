@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional, Set
+import threading
+import logging
+import signal
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from source.system_settings import setup_logging
+from source.queues import Message, MessageQueue, create_queue
+
+setup_logging(__name__)
+
+MESSAGES = Counter(
+    "app_consumer_messages", "Number of consumed messages, by result (acked or nacked).", ["result"]
+)
+BATCH_DURATION = Histogram(
+    "app_consumer_batch_duration_seconds", "Processing time of the message batches in seconds."
+)
+BATCHES_IN_FLIGHT = Gauge(
+    "app_consumer_batches_in_flight", "Number of message batches being processed."
+)
+UTILIZATION = Gauge(
+    "app_consumer_utilization_ratio", "Ratio of message batches being processed to workers."
+)
+BACKLOG = Gauge(
+    "app_consumer_backlog_messages", "Number of undelivered messages of the queue, if it reports it."
+)
+
+
+class Consumer:
+    """
+    Consumer pulling messages from a queue in batches and processing the batches concurrently in a pool of worker
+    threads. A new batch is only pulled when a worker is free, so unprocessed messages stay in the queue, available to
+    the other replicas.
+
+    The handler is called with each batch and returns the IDs of the messages it failed to process. The other messages
+    are acknowledged in a single call, and the failed ones are released for redelivery in another. If the handler
+    raises an exception, the whole batch is released.
+
+    On SIGTERM (e.g. a pod scale-down) or SIGINT, it stops pulling and drains the batches being processed for up to
+    `drain_timeout` seconds; the messages of unfinished batches are redelivered after their ack deadline.
+
+    Parameters
+    ----------
+    queue : MessageQueue
+        Queue to be consumed.
+    handler : Callable[[List[Message]], Optional[Iterable[str]]]
+        Function processing a batch of messages, returning the IDs of the failed messages.
+    batch_size : int
+        Maximum number of messages per batch.
+    max_workers : int
+        Maximum number of batches processed at the same time.
+    pull_timeout : float
+        Seconds to wait for messages on each pull.
+    drain_timeout : float
+        Seconds to let the batches being processed finish when stopping.
+    backlog_interval : float
+        Seconds between updates of the backlog metric.
+
+    Examples
+    --------
+    >>> consumer = Consumer(SQLiteQueue("queue.db"), process_messages, batch_size=100, max_workers=4)
+    >>> consumer.run()  # doctest: +SKIP
+    """
+
+    def __init__(
+            self,
+            queue: MessageQueue,
+            handler: Callable[[List[Message]], Optional[Iterable[str]]],
+            batch_size: int = 100,
+            max_workers: int = 4,
+            pull_timeout: float = 5.0,
+            drain_timeout: float = 25.0,
+            backlog_interval: float = 15.0
+    ):
+        if batch_size < 1 or max_workers < 1:
+            raise ValueError(f"Invalid consumer batch size or workers: {batch_size}, {max_workers}")
+
+        self.queue = queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.pull_timeout = pull_timeout
+        self.drain_timeout = drain_timeout
+        self.backlog_interval = backlog_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consumer")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._batches: Set[Future] = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self, *_) -> None:
+        """
+        Stop pulling messages, so `run` drains the batches being processed and returns. Also used as a signal handler.
+        """
+        if not self._stop_event.is_set():
+            logging.info("Stopping consumer...")
+
+        self._stop_event.set()
+
+    def install_signal_handlers(self) -> None:
+        """
+        Stop the consumer on SIGTERM and SIGINT. Must be called from the main thread.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self) -> None:
+        """
+        Consume the queue until the consumer is stopped, then drain the batches being processed.
+        """
+        logging.info(f"Consumer started with batches of {self.batch_size} message(s) and {self.max_workers} worker(s).")
+        next_backlog_update = 0.0
+
+        try:
+            while not self._stop_event.is_set():
+                if time.monotonic() >= next_backlog_update:
+                    self._update_backlog()
+                    next_backlog_update = time.monotonic() + self.backlog_interval
+
+                # Wait for a free worker before pulling, so pulled messages never wait in the process
+                if not self._slots.acquire(timeout=1.0):
+                    continue
+
+                try:
+                    messages = [] if self._stop_event.is_set() else self.queue.pull(self.batch_size, self.pull_timeout)
+                except Exception as exception:
+                    logging.error(f"Failed to pull messages: {exception!r}")
+                    messages = []
+                    self._stop_event.wait(1.0)
+
+                if not messages:
+                    self._slots.release()
+                    continue
+
+                self._submit(messages)
+        finally:
+            self._drain()
+
+    def _submit(self, messages: List[Message]) -> None:
+        with self._lock:
+            BATCHES_IN_FLIGHT.inc()
+            UTILIZATION.set((len(self._batches) + 1) / self.max_workers)
+            future = self._executor.submit(self._process, messages)
+            self._batches.add(future)
+
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._batches.discard(future)
+            BATCHES_IN_FLIGHT.dec()
+            UTILIZATION.set(len(self._batches) / self.max_workers)
+
+        self._slots.release()
+
+    def _process(self, messages: List[Message]) -> None:
+        start_time = time.perf_counter()
+
+        try:
+            failed_ids = set(self.handler(messages) or ())
+        except Exception as exception:
+            logging.error(f"Failed to process a batch of {len(messages)} message(s): {exception!r}")
+            failed_ids = {message.id for message in messages}
+
+        BATCH_DURATION.observe(time.perf_counter() - start_time)
+
+        acked = [message.ack_id for message in messages if message.id not in failed_ids]
+        nacked = [message.ack_id for message in messages if message.id in failed_ids]
+
+        try:
+            if acked:
+                self.queue.ack(acked)
+                MESSAGES.labels("acked").inc(len(acked))
+
+            if nacked:
+                self.queue.nack(nacked)
+                MESSAGES.labels("nacked").inc(len(nacked))
+        except Exception as exception:
+            # Unacknowledged messages are redelivered after their ack deadline
+            logging.error(f"Failed to acknowledge a batch of {len(messages)} message(s): {exception!r}")
+
+    def _update_backlog(self) -> None:
+        try:
+            backlog = self.queue.backlog()
+        except Exception as exception:
+            logging.warning(f"Failed to get the queue backlog: {exception!r}")
+            return
+
+        if backlog is not None:
+            BACKLOG.set(backlog)
+
+    def _drain(self) -> None:
+        with self._lock:
+            running = list(self._batches)
+
+        logging.info(f"Draining {len(running)} batch(es) being processed...")
+        _, not_done = wait(running, timeout=self.drain_timeout)
+
+        if not_done:
+            logging.warning(f"{len(not_done)} batch(es) did not finish within {self.drain_timeout} seconds.")
+
+        self._executor.shutdown(wait=not not_done, cancel_futures=True)
+        self.queue.close()
+        logging.info("Consumer stopped.")
+
+
+def create_consumer(consumer_settings: dict, handler: Callable[[List[Message]], Optional[Iterable[str]]]) -> Consumer:
+    """
+    Create a consumer of the queue of the `consumer` block of `settings.yaml`. Its metrics are served with the
+    process ones by `run.py`.
+
+    Parameters
+    ----------
+    consumer_settings : dict
+        The `consumer` block of `settings.yaml`.
+    handler : Callable[[List[Message]], Optional[Iterable[str]]]
+        Function processing a batch of messages, returning the IDs of the failed messages.
+
+    Returns
+    -------
+    Consumer
+        The consumer.
+    """
+    return Consumer(
+        create_queue(consumer_settings.get('queue') or {}),
+        handler,
+        batch_size=consumer_settings.get('batch_size', 100),
+        max_workers=consumer_settings.get('max_workers', 4),
+        pull_timeout=consumer_settings.get('pull_timeout', 5.0),
+        drain_timeout=consumer_settings.get('drain_timeout', 25.0)
+    )
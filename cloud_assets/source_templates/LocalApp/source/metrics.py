@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import Iterator
+
+from prometheus_client import REGISTRY, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+from source.system_settings import get_logging_stats
+
+
+class LoggingStatsCollector:
+    """
+    Collector of the logging queue and log transport statistics (see `get_logging_stats`), read at scrape time.
+    """
+
+    def collect(self) -> Iterator[Metric]:
+        stats = get_logging_stats()
+
+        yield GaugeMetricFamily(
+            "app_logging_queue_depth", "Number of log records waiting in the logging queue.",
+            value=stats['queue_depth']
+        )
+        yield CounterMetricFamily(
+            "app_logging_dropped_records", "Number of log records dropped by a full logging queue or log transport "
+            "buffer, or in a failed log batch.",
+            value=stats['dropped_records'] + stats['transport']['dropped_records']
+        )
+        yield CounterMetricFamily(
+            "app_logging_failed_batches", "Number of log batches the log transport failed to write.",
+            value=stats['transport']['failed_batches']
+        )
+
+
+def init_metrics(port: int) -> None:
+    """
+    Serve the Prometheus metrics of the process (CPU, memory, garbage collection, logging, and those of the consumer
+    mode) on a port.
+
+    Parameters
+    ----------
+    port : int
+        Port of the metrics endpoint.
+    """
+    REGISTRY.register(LoggingStatsCollector())
+    start_http_server(port)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+import threading
+import sqlite3
+import json
+import time
+import uuid
+
+Message = namedtuple("Message", ["id", "data", "attributes", "ack_id"])
+
+
+class MessageQueue(ABC):
+    """
+    Interface of the queues consumed by `Consumer`. Messages pulled and not acknowledged within the ack deadline of
+    the queue are delivered again.
+    """
+
+    @abstractmethod
+    def pull(self, max_messages: int, timeout: float) -> List[Message]:
+        """
+        Pull up to `max_messages` messages, waiting at most `timeout` seconds for the first one.
+        """
+
+    @abstractmethod
+    def ack(self, ack_ids: Iterable[str]) -> None:
+        """
+        Acknowledge processed messages in bulk, so they are not delivered again.
+        """
+
+    @abstractmethod
+    def nack(self, ack_ids: Iterable[str]) -> None:
+        """
+        Release failed messages in bulk, so they are delivered again right away.
+        """
+
+    def backlog(self) -> Optional[int]:
+        """
+        Get the number of undelivered messages, or None if the queue does not report it.
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Release the resources of the queue.
+        """
+
+
+class PubSubQueue(MessageQueue):
+    """
+    Google Cloud Pub/Sub subscription, pulled synchronously. The backlog is reported by Cloud Monitoring as the
+    `pubsub.googleapis.com/subscription/num_undelivered_messages` metric, which the HPA can scale on. Poison messages
+    are forwarded to the dead-letter topic of the subscription, with its maximum number of delivery attempts.
+
+    Parameters
+    ----------
+    project_id : str
+        Google Cloud project ID.
+    subscription : str
+        Subscription ID.
+    """
+
+    def __init__(self, project_id: str, subscription: str):
+        from google.cloud import pubsub_v1
+
+        self._client = pubsub_v1.SubscriberClient()
+        self._subscription = self._client.subscription_path(project_id, subscription)
+
+    def pull(self, max_messages: int, timeout: float) -> List[Message]:
+        from google.api_core import exceptions
+
+        try:
+            response = self._client.pull(
+                request={'subscription': self._subscription, 'max_messages': max_messages}, timeout=timeout
+            )
+        except exceptions.DeadlineExceeded:
+            return []
+
+        return [
+            Message(
+                id=received.message.message_id,
+                data=received.message.data,
+                attributes=dict(received.message.attributes),
+                ack_id=received.ack_id
+            )
+            for received in response.received_messages
+        ]
+
+    def ack(self, ack_ids: Iterable[str]) -> None:
+        ack_ids = list(ack_ids)
+
+        if ack_ids:
+            self._client.acknowledge(request={'subscription': self._subscription, 'ack_ids': ack_ids})
+
+    def nack(self, ack_ids: Iterable[str]) -> None:
+        ack_ids = list(ack_ids)
+
+        if ack_ids:
+            self._client.modify_ack_deadline(
+                request={'subscription': self._subscription, 'ack_ids': ack_ids, 'ack_deadline_seconds': 0}
+            )
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class SQLiteQueue(MessageQueue):
+    """
+    Local queue stored in a SQLite file, standing in for Pub/Sub in tests and local runs. Messages can be published
+    by other processes sharing the file.
+
+    Messages delivered `max_attempts` times without being acknowledged (e.g. poison messages failing or crashing
+    every batch) are moved to the `dead_letters` table instead of being delivered again.
+
+    Parameters
+    ----------
+    filepath : str
+        SQLite database filepath, or ":memory:".
+    ack_deadline : float
+        Seconds before a pulled message that was not acknowledged is delivered again.
+    poll_interval : float
+        Seconds between polls of an empty queue.
+    max_attempts : int
+        Maximum number of deliveries of a message before it is dead-lettered, or None for no limit.
+    """
+
+    def __init__(
+            self,
+            filepath: str = "queue.db",
+            ack_deadline: float = 60.0,
+            poll_interval: float = 0.2,
+            max_attempts: Optional[int] = 5
+    ):
+        self.ack_deadline = ack_deadline
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._connection = sqlite3.connect(filepath, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB NOT NULL, attributes TEXT NOT NULL, "
+                "visible_at REAL NOT NULL DEFAULT 0, ack_id TEXT, attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letters ("
+                "id INTEGER PRIMARY KEY, data BLOB NOT NULL, attributes TEXT NOT NULL, attempts INTEGER NOT NULL, "
+                "dead_lettered_at REAL NOT NULL)"
+            )
+
+            # Queue files created before delivery attempts were counted
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(messages)")}
+
+            if "attempts" not in columns:
+                self._connection.execute("ALTER TABLE messages ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+            self._connection.execute("CREATE INDEX IF NOT EXISTS messages_visible_at ON messages (visible_at)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS messages_ack_id ON messages (ack_id)")
+
+    def publish(self, messages: Iterable[bytes], attributes: Dict[str, str] = None) -> int:
+        """
+        Publish messages in bulk.
+
+        Parameters
+        ----------
+        messages : Iterable[bytes]
+            Message payloads.
+        attributes : Dict[str, str]
+            Attributes of every message.
+
+        Returns
+        -------
+        int
+            Number of published messages.
+        """
+        rows = [(data, json.dumps(attributes or {})) for data in messages]
+
+        # The connection context commits the transaction, or rolls it back on errors so it is never left open
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany("INSERT INTO messages (data, attributes) VALUES (?, ?)", rows)
+
+        return len(rows)
+
+    def pull(self, max_messages: int, timeout: float) -> List[Message]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            now = time.time()
+
+            with self._lock, self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+
+                if self.max_attempts is not None:
+                    self._dead_letter_exhausted(now)
+
+                rows = self._connection.execute(
+                    "SELECT id, data, attributes FROM messages WHERE visible_at <= ? ORDER BY id LIMIT ?",
+                    (now, max_messages)
+                ).fetchall()
+                ack_ids = [uuid.uuid4().hex for _ in rows]
+                self._connection.executemany(
+                    "UPDATE messages SET visible_at = ?, ack_id = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.ack_deadline, ack_id, row[0]) for ack_id, row in zip(ack_ids, rows)]
+                )
+
+            if rows or time.monotonic() >= deadline:
+                return [
+                    Message(id=str(row[0]), data=row[1], attributes=json.loads(row[2]), ack_id=ack_id)
+                    for ack_id, row in zip(ack_ids, rows)
+                ]
+
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def _dead_letter_exhausted(self, now: float) -> None:
+        """
+        Move the deliverable messages that reached the maximum number of attempts to the `dead_letters` table, within
+        the open transaction.
+        """
+        condition = "visible_at <= ? AND attempts >= ?"
+        self._connection.execute(
+            "INSERT INTO dead_letters (id, data, attributes, attempts, dead_lettered_at) "
+            f"SELECT id, data, attributes, attempts, ? FROM messages WHERE {condition}",
+            (now, now, self.max_attempts)
+        )
+        self._connection.execute(f"DELETE FROM messages WHERE {condition}", (now, self.max_attempts))
+
+    def dead_letters(self, max_messages: int = 100) -> List[Message]:
+        """
+        Get the oldest dead-lettered messages, with their number of delivery attempts in the `delivery_attempts`
+        attribute.
+
+        Parameters
+        ----------
+        max_messages : int
+            Maximum number of messages.
+
+        Returns
+        -------
+        List[Message]
+            Dead-lettered messages, without ack IDs.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, data, attributes, attempts FROM dead_letters ORDER BY id LIMIT ?", (max_messages,)
+            ).fetchall()
+
+        return [
+            Message(
+                id=str(row[0]), data=row[1], attributes={**json.loads(row[2]), 'delivery_attempts': str(row[3])},
+                ack_id=None
+            )
+            for row in rows
+        ]
+
+    def ack(self, ack_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._connection.executemany("DELETE FROM messages WHERE ack_id = ?", [(ack_id,) for ack_id in ack_ids])
+
+    def nack(self, ack_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE messages SET visible_at = 0, ack_id = NULL WHERE ack_id = ?", [(ack_id,) for ack_id in ack_ids]
+            )
+
+    def backlog(self) -> Optional[int]:
+        # Leased messages, pulled but neither acknowledged nor expired, are not waiting to be delivered
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE visible_at <= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def create_queue(queue_settings: dict) -> MessageQueue:
+    """
+    Create the queue of the `queue` settings of the `consumer` block of `settings.yaml`.
+
+    Parameters
+    ----------
+    queue_settings : dict
+        Queue type ("pubsub" or "sqlite") and its parameters.
+
+    Returns
+    -------
+    MessageQueue
+        The queue.
+    """
+    queue_type = queue_settings.get('type', "sqlite")
+
+    if queue_type == "pubsub":
+        return PubSubQueue(queue_settings['project_id'], queue_settings['subscription'])
+
+    if queue_type == "sqlite":
+        return SQLiteQueue(
+            queue_settings.get('filepath', "queue.db"),
+            ack_deadline=queue_settings.get('ack_deadline', 60.0),
+            max_attempts=queue_settings.get('max_attempts', 5)
+        )
+
+    raise ValueError(f"Invalid queue type: '{queue_type}'")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+import threading
+import logging
+import signal
+import time
+
+from source.system_settings import setup_logging
+
+setup_logging(__name__)
+
+MISFIRE_POLICIES = ("skip", "run_once", "catch_up")
+
+
+class Job:
+    """
+    Periodic job run at a fixed rate: runs are scheduled every `interval` seconds from the first run, regardless of
+    how long each run takes.
+
+    Parameters
+    ----------
+    function : Callable
+        Function run by the job, without arguments. It must be a module-level function with a process pool.
+    interval : float
+        Seconds between the scheduled runs.
+    name : str
+        Job name. Defaults to the function name.
+    misfire : str
+        Policy for runs missed because the previous runs were still running or the process was busy:
+        "skip" drops the missed runs, "run_once" runs once for all of them, and "catch_up" runs each of them.
+    max_instances : int
+        Maximum number of runs of the job at the same time.
+    start_delay : float
+        Seconds before the first run.
+    """
+
+    def __init__(
+            self,
+            function: Callable,
+            interval: float,
+            name: str = None,
+            misfire: str = "run_once",
+            max_instances: int = 1,
+            start_delay: float = 0.0
+    ):
+        if interval <= 0:
+            raise ValueError(f"Invalid job interval: {interval}")
+
+        if misfire not in MISFIRE_POLICIES:
+            raise ValueError(f"Invalid misfire policy: '{misfire}'")
+
+        self.function = function
+        self.interval = interval
+        self.name = name or function.__name__
+        self.misfire = misfire
+        self.max_instances = max_instances
+        self.next_run = time.monotonic() + start_delay
+        self.running: List[Future] = []
+        self.missed = 0
+
+    def __repr__(self) -> str:
+        return f"Job({self.name!r}, interval={self.interval!r})"
+
+
+class Scheduler:
+    """
+    Scheduler running periodic jobs and one-off tasks in a pool of worker threads or processes.
+
+    On SIGTERM (e.g. a pod scale-down) or SIGINT, it stops scheduling new runs and drains the running ones for up to
+    `drain_timeout` seconds, which must be below the `terminationGracePeriodSeconds` of the deployment.
+
+    Parameters
+    ----------
+    max_workers : int
+        Maximum number of jobs and tasks running at the same time.
+    executor : str
+        Worker pool type: "thread" for I/O-bound work, or "process" for CPU-bound work.
+    drain_timeout : float
+        Seconds to let running jobs and tasks finish when stopping.
+
+    Examples
+    --------
+    >>> scheduler = Scheduler(max_workers=4)
+    >>> scheduler.add_job(hello_world, interval=60)
+    Job('hello_world', interval=60)
+    >>> scheduler.run()  # doctest: +SKIP
+    """
+
+    def __init__(self, max_workers: int = 4, executor: str = "thread", drain_timeout: float = 25.0):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Invalid executor type: '{executor}'")
+
+        self.max_workers = max_workers
+        self.executor_type = executor
+        self.drain_timeout = drain_timeout
+        self.jobs: Dict[str, Job] = {}
+        self._executor: Executor = None
+        self._tasks: List[Future] = []
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def add_job(self, function: Callable, interval: float, **kwargs) -> Job:
+        """
+        Add a periodic job.
+
+        Parameters
+        ----------
+        function : Callable
+            Function run by the job, without arguments.
+        interval : float
+            Seconds between the scheduled runs.
+        kwargs : dict
+            Other `Job` parameters.
+
+        Returns
+        -------
+        Job
+            The added job.
+        """
+        job = Job(function, interval, **kwargs)
+
+        if job.name in self.jobs:
+            raise ValueError(f"Duplicated job name: '{job.name}'")
+
+        self.jobs[job.name] = job
+        self._wake_event.set()
+
+        return job
+
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        """
+        Run a one-off task in the worker pool, e.g. to process the items of a job in parallel.
+
+        Parameters
+        ----------
+        function : Callable
+            Function to be run.
+        args : tuple
+            Positional arguments of the function.
+        kwargs : dict
+            Keyword arguments of the function.
+
+        Returns
+        -------
+        Future
+            Future of the task result.
+        """
+        future = self._get_executor().submit(function, *args, **kwargs)
+        self._tasks.append(future)
+        future.add_done_callback(self._tasks.remove)
+
+        return future
+
+    def stop(self, *_) -> None:
+        """
+        Stop scheduling new runs, so `run` drains the running ones and returns. Also used as a signal handler.
+        """
+        if not self._stop_event.is_set():
+            logging.info("Stopping scheduler...")
+
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def install_signal_handlers(self) -> None:
+        """
+        Stop the scheduler on SIGTERM and SIGINT. Must be called from the main thread.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self) -> None:
+        """
+        Run the jobs until the scheduler is stopped, then drain the running jobs and tasks.
+        """
+        logging.info(
+            f"Scheduler started with {len(self.jobs)} job(s) and {self.max_workers} {self.executor_type} worker(s)."
+        )
+
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+
+                for job in self.jobs.values():
+                    if job.next_run <= now:
+                        self._run_job(job, now)
+
+                next_run = min((job.next_run for job in self.jobs.values()), default=now + 60)
+                self._wake_event.wait(max(0.0, next_run - time.monotonic()))
+                self._wake_event.clear()
+        finally:
+            self._drain()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = ThreadPoolExecutor if self.executor_type == "thread" else ProcessPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers)
+
+        return self._executor
+
+    def _run_job(self, job: Job, now: float) -> None:
+        # Runs scheduled up to now, the due one included
+        due_runs = int((now - job.next_run) // job.interval) + 1
+        job.next_run += due_runs * job.interval
+        job.running = [future for future in job.running if not future.done()]
+        free_instances = job.max_instances - len(job.running)
+
+        if job.misfire == "catch_up":
+            runs = due_runs
+        else:
+            runs = 1 if job.misfire == "run_once" or due_runs == 1 else 0
+
+        runs = max(0, min(runs, free_instances))
+
+        if due_runs > runs:
+            job.missed += due_runs - runs
+            logging.warning(
+                f"Job '{job.name}' missed {due_runs - runs} run(s) "
+                f"({len(job.running)} still running, misfire policy: '{job.misfire}')."
+            )
+
+        for _ in range(runs):
+            logging.debug(f"Running job '{job.name}'...")
+            future = self._get_executor().submit(job.function)
+            future.add_done_callback(lambda done, name=job.name: self._log_result(name, done))
+            job.running.append(future)
+
+    @staticmethod
+    def _log_result(name: str, future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"Job '{name}' failed: {future.exception()!r}")
+
+    def _drain(self) -> None:
+        if self._executor is None:
+            return
+
+        running = [future for job in self.jobs.values() for future in job.running] + list(self._tasks)
+        logging.info(f"Draining {sum(not future.done() for future in running)} running job(s) and task(s)...")
+
+        _, not_done = wait(running, timeout=self.drain_timeout)
+
+        if not_done:
+            logging.warning(f"{len(not_done)} job(s) and task(s) did not finish within {self.drain_timeout} seconds.")
+
+        self._executor.shutdown(wait=not not_done, cancel_futures=True)
+        self._executor = None
+        logging.info("Scheduler stopped.")
+
+
+def create_scheduler(scheduler_settings: dict, jobs: Dict[str, Callable]) -> Scheduler:
+    """
+    Create a scheduler with the jobs of the `scheduler` block of `settings.yaml`.
+
+    Parameters
+    ----------
+    scheduler_settings : dict
+        The `scheduler` block of `settings.yaml`, whose `jobs` map job names to `Job` parameters.
+    jobs : Dict[str, Callable]
+        Functions of the jobs by name.
+
+    Returns
+    -------
+    Scheduler
+        Scheduler with its jobs added.
+    """
+    scheduler = Scheduler(
+        max_workers=scheduler_settings.get('max_workers', 4),
+        executor=scheduler_settings.get('executor', "thread"),
+        drain_timeout=scheduler_settings.get('drain_timeout', 25.0)
+    )
+
+    for name, job_settings in (scheduler_settings.get('jobs') or {}).items():
+        if name not in jobs:
+            raise ValueError(f"Unknown job: '{name}'")
+
+        scheduler.add_job(jobs[name], name=name, **job_settings)
+
+    return scheduler
@@ -4,30 +4,131 @@
 # João Antunes <joao8tunes@gmail.com>
 # https://github.com/joao8tunes
 
-import coloredlogs
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue, Full
+from typing import List, TextIO
+import threading
 import logging
+import atexit
+import json
+import time
 import yaml
 import sys
 import os
 
-from google.cloud import logging as gcp_logging
-
 LOG_LEVELS = ("NOTSET", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+SETTINGS_ENV_PREFIX = "SETTINGS__"
+
+_settings_cache = {}
+_settings_lock = threading.Lock()
+_logging_state = {'installed': False, 'queue_handler': None, 'listener': None, 'transport_handler': None}
+_logging_lock = threading.RLock()
+
+
+def get_settings_filepath() -> str:
+    """
+    Get the application settings filepath.
+
+    Returns
+    -------
+    str
+        YAML-based settings filepath.
+    """
+    this_dir_path = os.path.abspath(os.path.join(os.path.realpath(__file__), os.pardir))
+
+    return os.path.normpath(os.path.join(*[this_dir_path, "..", "assets", "settings.yaml"]))
 
 
 def get_settings() -> dict:
     """
     Import application settings from YAML-based file.
 
+    Settings are cached process-wide and only read again when the file changes (modification time, inode or
+    size). Environment variable overrides are applied once per read. The returned dictionary is shared, so it
+    must not be modified.
+
     Returns
     -------
     dict
         Application settings.
     """
-    # Loading YAML-based settings file:
-    this_dir_path = os.path.abspath(os.path.join(os.path.realpath(__file__), os.pardir))
-    settings_filepath = os.path.join(*[this_dir_path, "..", "assets", "settings.yaml"])
-    settings = read_yaml(settings_filepath)
+    filepath = get_settings_filepath()
+    stat = os.stat(filepath)
+    signature = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+    cached = _settings_cache.get(filepath)
+
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with _settings_lock:
+        cached = _settings_cache.get(filepath)
+
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        # Loading YAML-based settings file:
+        settings = apply_env_overrides(read_yaml(filepath) or {})
+        _settings_cache[filepath] = (signature, settings)
+
+    return settings
+
+
+def reload_settings() -> dict:
+    """
+    Drop the cached application settings and import them again.
+
+    Returns
+    -------
+    dict
+        Application settings.
+    """
+    with _settings_lock:
+        _settings_cache.clear()
+
+    return get_settings()
+
+
+def apply_env_overrides(settings: dict, environ: dict = None) -> dict:
+    """
+    Override settings with environment variables.
+
+    Variables named `SETTINGS__<SECTION>__<KEY>` override the `key` entry of the `section` block, with any number
+    of nesting levels. Values are parsed as YAML, so numbers and booleans keep their types.
+
+    Parameters
+    ----------
+    settings : dict
+        Application settings, updated in place.
+    environ : dict
+        Environment variables. Defaults to `os.environ`.
+
+    Returns
+    -------
+    dict
+        Application settings.
+
+    Examples
+    --------
+    >>> apply_env_overrides({'system': {'log_level': "DEBUG"}}, {'SETTINGS__SYSTEM__LOG_LEVEL': "INFO"})
+    {'system': {'log_level': 'INFO'}}
+    """
+    environ = os.environ if environ is None else environ
+
+    for name, value in environ.items():
+        if not name.startswith(SETTINGS_ENV_PREFIX):
+            continue
+
+        keys = name[len(SETTINGS_ENV_PREFIX):].lower().split("__")
+        section = settings
+
+        for key in keys[:-1]:
+            if not isinstance(section.get(key), dict):
+                section[key] = {}
+
+            section = section[key]
+
+        section[keys[-1]] = yaml.safe_load(value)
 
     return settings
 
@@ -52,17 +153,389 @@ def read_yaml(filepath: str) -> dict:
     return content
 
 
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full.
+
+    Parameters
+    ----------
+    queue : Queue
+        Bounded queue consumed by a `QueueListener`.
+    """
+
+    def __init__(self, queue: Queue):
+        super().__init__(queue)
+        self.dropped_records = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped_records += 1
+
+
+class StdoutJsonSink:
+    """
+    Log sink writing one structured JSON entry per line to stdout, which the GKE logging agent parses into Cloud
+    Logging entries without any API calls.
+
+    Parameters
+    ----------
+    stream : TextIO
+        Output stream. Defaults to `sys.stdout`.
+    """
+
+    def __init__(self, stream: TextIO = None):
+        self.stream = stream
+
+    def write(self, entries: List[dict]) -> None:
+        stream = self.stream or sys.stdout
+        stream.write("".join(json.dumps(entry, default=str) + "\n" for entry in entries))
+        stream.flush()
+
+
+class CloudLoggingSink:
+    """
+    Log sink sending each batch of entries to the Cloud Logging API in a single request.
+
+    Parameters
+    ----------
+    client : google.cloud.logging.Client
+        Cloud Logging client.
+    log_name : str
+        Name of the log the entries are written to.
+    """
+
+    def __init__(self, client, log_name: str = "python"):
+        self.logger = client.logger(log_name)
+
+        # The public handler infers the monitored resource (e.g. the GKE container) from the environment; it is only
+        # built for it, with a synchronous transport that starts no thread. Without it, entries use the global resource
+        try:
+            from google.cloud.logging.handlers import CloudLoggingHandler
+            from google.cloud.logging.handlers.transports import SyncTransport
+
+            self.resource = CloudLoggingHandler(client, name=log_name, transport=SyncTransport).resource
+        except ImportError:
+            self.resource = None
+
+    def write(self, entries: List[dict]) -> None:
+        batch = self.logger.batch()
+
+        for entry in entries:
+            entry = dict(entry)
+            severity = entry.pop('severity')
+            batch.log_struct(entry, severity=severity, resource=self.resource)
+
+        batch.commit()
+
+
+class MemorySink:
+    """
+    Local stand-in for a log sink, keeping batches in memory so flush behaviour can be load-tested offline.
+
+    Parameters
+    ----------
+    delay : float
+        Simulated write latency per batch, in seconds.
+
+    Examples
+    --------
+    >>> sink = MemorySink(delay=0.05)
+    >>> handler = BatchingHandler(sink, batch_size=100, flush_interval=0.5)
+    >>> logging.getLogger("load-test").addHandler(handler)
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def write(self, entries: List[dict]) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+
+        self.batches.append(entries)
+
+
+class BatchingHandler(logging.Handler):
+    """
+    Logging handler buffering structured entries and writing them to a sink in batches from a background thread.
+
+    A batch is written when it reaches `batch_size` entries or every `flush_interval` seconds. The buffer is bounded
+    by `max_buffered_bytes`: when it is full, new records are dropped (`backpressure="drop"`) or the logging thread
+    waits for the next flush (`backpressure="block"`).
+
+    Parameters
+    ----------
+    sink : object
+        Sink with a `write(entries)` method, e.g. `CloudLoggingSink`, `StdoutJsonSink` or `MemorySink`.
+    batch_size : int
+        Maximum number of entries per batch.
+    flush_interval : float
+        Maximum time an entry waits in the buffer, in seconds.
+    max_buffered_bytes : int
+        Maximum approximate size of the buffered messages, in bytes.
+    backpressure : str
+        Policy when the buffer is full: "drop" or "block".
+    """
+
+    def __init__(
+            self,
+            sink,
+            batch_size: int = 100,
+            flush_interval: float = 1.0,
+            max_buffered_bytes: int = 1048576,
+            backpressure: str = "drop"
+    ):
+        super().__init__()
+
+        if backpressure not in ("drop", "block"):
+            raise ValueError(f"Invalid backpressure policy: '{backpressure}'")
+
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered_bytes = max_buffered_bytes
+        self.backpressure = backpressure
+        self.stats = {'sent_records': 0, 'dropped_records': 0, 'batches': 0, 'failed_batches': 0}
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="BatchingHandler", daemon=True)
+        self._thread.start()
+
+    def format_entry(self, record: logging.LogRecord) -> dict:
+        """
+        Convert a log record to a structured entry, using the special fields understood by Cloud Logging.
+        """
+        return {
+            'severity': record.levelname,
+            'message': self.format(record),
+            'logger': record.name,
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'logging.googleapis.com/sourceLocation': {
+                'file': record.pathname, 'line': record.lineno, 'function': record.funcName
+            }
+        }
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            entry = self.format_entry(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        size = len(entry['message']) + 256
+
+        with self._condition:
+            while self._buffered_bytes + size > self.max_buffered_bytes and self._buffer and not self._closed:
+                if self.backpressure == "drop":
+                    self.stats['dropped_records'] += 1
+                    return
+
+                self._condition.notify_all()
+                self._condition.wait()
+
+            self._buffer.append(entry)
+            self._buffered_bytes += size
+
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify_all()
+
+    def _take_batch(self) -> List[dict]:
+        batch = self._buffer[:self.batch_size]
+        del self._buffer[:self.batch_size]
+        self._buffered_bytes = sum(len(entry['message']) + 256 for entry in self._buffer)
+        self._condition.notify_all()
+
+        return batch
+
+    def _write_batch(self, batch: List[dict]) -> None:
+        try:
+            self.sink.write(batch)
+            self.stats['sent_records'] += len(batch)
+            self.stats['batches'] += 1
+        except Exception as e:
+            self.stats['failed_batches'] += 1
+            self.stats['dropped_records'] += len(batch)
+
+            # Reported to the last resort handler (stderr), as the failing sink may be the one of the root logger;
+            # only the first and every hundredth failure, so an unreachable sink does not flood it
+            failed_batches = self.stats['failed_batches']
+
+            if failed_batches % 100 == 1:
+                logging.lastResort.handle(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.ERROR, 'levelname': "ERROR",
+                    'msg': f"Failed to write {len(batch)} log entries (failed batch {failed_batches}): {e}"
+                }))
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._buffer) >= self.batch_size or self._closed, timeout=self.flush_interval
+                )
+
+                if self._closed and not self._buffer:
+                    return
+
+                batch = self._take_batch()
+
+            if batch:
+                self._write_batch(batch)
+
+    def restart(self) -> None:
+        """
+        Restart the background thread with an empty buffer, e.g. in a forked child process.
+        """
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="BatchingHandler", daemon=True)
+        self._thread.start()
+
+    def flush(self) -> None:
+        """
+        Write every buffered entry synchronously.
+        """
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+
+            if not batch:
+                return
+
+            self._write_batch(batch)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        self._thread.join(timeout=max(self.flush_interval, 1.0) * 5)
+        self.flush()
+        super().close()
+
+
+def create_log_transport(transport_settings: dict) -> logging.Handler:
+    """
+    Create the batching log handler configured in the `log_transport` system setting.
+
+    Parameters
+    ----------
+    transport_settings : dict
+        Transport settings: `type` ("cloud", "stdout_json" or "memory"), `batch_size`, `flush_interval`,
+        `max_buffered_bytes` and `backpressure`.
+
+    Returns
+    -------
+    logging.Handler
+        Batching log handler.
+    """
+    transport_type = transport_settings.get('type', "cloud")
+
+    if transport_type == "cloud":
+        # Imported lazily: the Cloud Logging client is slow to import and unused by the other transports
+        from google.cloud import logging as gcp_logging
+
+        sink = CloudLoggingSink(gcp_logging.Client())
+    elif transport_type == "stdout_json":
+        sink = StdoutJsonSink()
+    elif transport_type == "memory":
+        sink = MemorySink()
+    else:
+        raise ValueError(f"Invalid log transport type: '{transport_type}'")
+
+    return BatchingHandler(
+        sink,
+        batch_size=transport_settings.get('batch_size', 100),
+        flush_interval=transport_settings.get('flush_interval', 1.0),
+        max_buffered_bytes=transport_settings.get('max_buffered_bytes', 1048576),
+        backpressure=transport_settings.get('backpressure', "drop")
+    )
+
+
+def get_logging_stats() -> dict:
+    """
+    Get statistics of the logging queue and of the batching log transport.
+
+    Returns
+    -------
+    dict
+        Current queue depth, queue size and number of dropped records, and the `transport` statistics of the
+        `BatchingHandler` (sent, dropped and failed). Values are zero if logging does not use a queue or a transport.
+    """
+    queue_handler = _logging_state['queue_handler']
+    transport_handler = _logging_state['transport_handler']
+    transport_stats = dict(transport_handler.stats) if transport_handler is not None else {
+        'sent_records': 0, 'dropped_records': 0, 'batches': 0, 'failed_batches': 0
+    }
+
+    if queue_handler is None:
+        return {'queue_depth': 0, 'queue_size': 0, 'dropped_records': 0, 'transport': transport_stats}
+
+    return {
+        'queue_depth': queue_handler.queue.qsize(),
+        'queue_size': queue_handler.queue.maxsize,
+        'dropped_records': queue_handler.dropped_records,
+        'transport': transport_stats
+    }
+
+
+def _stop_queue_listener() -> None:
+    """
+    Stop the logging queue listener, flushing the pending records.
+    """
+    listener = _logging_state['listener']
+
+    if listener is not None and listener._thread is not None:
+        listener.stop()
+
+
+def _restart_after_fork() -> None:
+    """
+    Restart the logging background threads in a forked child process, where they do not exist.
+    """
+    queue_handler = _logging_state['queue_handler']
+    listener = _logging_state['listener']
+    handlers = list(listener.handlers) if listener is not None else logging.getLogger().handlers
+
+    for handler in handlers:
+        if isinstance(handler, BatchingHandler):
+            handler.restart()
+
+    if queue_handler is None or listener is None:
+        return
+
+    queue_handler.queue = Queue(maxsize=queue_handler.queue.maxsize)
+    queue_handler.dropped_records = 0
+    listener = QueueListener(queue_handler.queue, *listener.handlers, respect_handler_level=True)
+    listener.start()
+    _logging_state['listener'] = listener
+
+
 def setup_logging(
         name: str,
         log_filepath: str = None,
         mode: str = "a",
         primary_level: str = None,
         secondary_level: str = "CRITICAL",
-        secondary_modules: list = ("google", "urllib3", "matplotlib", "json5", "logs", "numba", "mlflow", "git")
+        secondary_modules: list = (
+            "asyncio", "google", "urllib3", "matplotlib", "json5", "logs", "numba", "mlflow", "git"
+        ),
+        force: bool = False
 ) -> None:
     """
     Setup default logging.
 
+    Handlers are installed once per process: later calls are no-ops unless `force` is set. With the `log_queue`
+    system setting, records are put in a bounded queue and written to the sinks (stdout, file, Cloud Logging) by a
+    background `QueueListener`, so slow sinks never block the logging threads. Records are dropped when the queue
+    is full, see `get_logging_stats`. On GCP, the `log_transport` system setting replaces the default Cloud Logging
+    handler with a `BatchingHandler`, see `create_log_transport`.
+
     Parameters
     ----------
     name : str
@@ -77,52 +550,99 @@ def setup_logging(
         Secondary log level.
     secondary_modules : list
         Secondary modules to filter.
+    force : bool
+        Install the handlers again, even if logging is already set up.
     """
-    # Loading settings
-    settings = get_settings()
-    log_level = settings.get('system').get('log_level')
+    with _logging_lock:
+        if _logging_state['installed'] and not force:
+            return
 
-    if not primary_level:
-        primary_level = log_level
+        # Loading settings
+        system_settings = get_settings().get('system')
+        log_level = system_settings.get('log_level')
 
-    # Remove all existing handlers to avoid duplication
-    logger = logging.getLogger()  # Root logger
+        if not primary_level:
+            primary_level = log_level
 
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
+        # Remove all existing handlers to avoid duplication
+        _stop_queue_listener()
+        logger = logging.getLogger()  # Root logger
 
-    if any(var in os.environ for var in ['KUBERNETES_SERVICE_HOST', 'K_SERVICE', 'FUNCTION_NAME']):
-        # Setup GCP logging
-        try:
-            logging_client = gcp_logging.Client()
-            logging_client.setup_logging(log_level=primary_level, excluded_loggers=secondary_modules)
-        except Exception as e:
-            # Handle exceptions that occur during GCP logging setup
-            logging.error(f"Failed to setup GCP logging: {e}")
-    else:
-        # Configure logging
-        logger = logging.getLogger(name)  # Named logger
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
 
-        logging_handlers = [logging.StreamHandler(sys.stdout)]
+            if isinstance(handler, BatchingHandler):
+                handler.close()
 
-        if log_filepath:
-            logging_handlers.append(logging.FileHandler(log_filepath, mode=mode))
+        use_queue = system_settings.get('log_queue', False)
+        logging_handlers = []
+        _logging_state['transport_handler'] = None
 
-        logging.basicConfig(
-            format="%(asctime)s %(name)s %(levelname)s: %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-            level=primary_level,
-            handlers=logging_handlers
-        )
+        if any(var in os.environ for var in ['KUBERNETES_SERVICE_HOST', 'K_SERVICE', 'FUNCTION_NAME']):
+            # Setup GCP logging
+            transport_settings = system_settings.get('log_transport')
 
-        # Install coloredlogs for better log readability
-        coloredlogs.install(level=primary_level, logger=logger, isatty=True)
+            try:
+                if transport_settings:
+                    _logging_state['transport_handler'] = create_log_transport(transport_settings)
+                    logging_handlers.append(_logging_state['transport_handler'])
+                else:
+                    # Imported lazily: the Cloud Logging client is slow to import and unused outside GCP
+                    from google.cloud import logging as gcp_logging
 
-        # Suppress warnings not sent by `logging` module
-        if secondary_level in ("ERROR", "CRITICAL"):
-            os.environ["PYTHONWARNINGS"] = "ignore"
+                    logging_client = gcp_logging.Client()
+
+                    if use_queue:
+                        logging_handlers.append(logging_client.get_default_handler())
+                    else:
+                        logging_client.setup_logging(log_level=primary_level, excluded_loggers=secondary_modules)
+            except Exception as e:
+                # Handle exceptions that occur during GCP logging setup
+                logging.error(f"Failed to setup GCP logging: {e}")
+        else:
+            # Configure logging with coloredlogs for better log readability, imported lazily as it is unused on GCP
+            import coloredlogs
+
+            log_format = "%(asctime)s %(name)s %(levelname)s: %(message)s"
+            date_format = "%Y-%m-%d %H:%M:%S"
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(coloredlogs.ColoredFormatter(fmt=log_format, datefmt=date_format))
+            logging_handlers.append(stream_handler)
+
+            if log_filepath:
+                file_handler = logging.FileHandler(log_filepath, mode=mode)
+                file_handler.setFormatter(logging.Formatter(fmt=log_format, datefmt=date_format))
+                logging_handlers.append(file_handler)
+
+            # Suppress warnings not sent by `logging` module
+            if secondary_level in ("ERROR", "CRITICAL"):
+                os.environ["PYTHONWARNINGS"] = "ignore"
+
+        if use_queue and logging_handlers:
+            queue_handler = DroppingQueueHandler(Queue(maxsize=system_settings.get('log_queue_size', 10000)))
+            listener = QueueListener(queue_handler.queue, *logging_handlers, respect_handler_level=True)
+            listener.start()
+            logger.addHandler(queue_handler)
+            _logging_state['queue_handler'] = queue_handler
+            _logging_state['listener'] = listener
+        else:
+            for handler in logging_handlers:
+                logger.addHandler(handler)
+
+            _logging_state['queue_handler'] = None
+            _logging_state['listener'] = None
+
+        logger.setLevel(primary_level)
 
         # Filter secondary logs
         for module in secondary_modules:
             secondary_logger = logging.getLogger(module)
             secondary_logger.setLevel(secondary_level)
+
+        _logging_state['installed'] = True
+
+
+atexit.register(_stop_queue_listener)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import List, Tuple
+import subprocess
+import time
+import sys
+import os
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+
+def measure_import_time(module: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """
+    Import a module in a fresh interpreter with `python -X importtime` and collect the import times.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to be imported, e.g. 'wsgi' or 'run'.
+
+    Returns
+    -------
+    Tuple[float, List[Tuple[int, int, str]]]
+        Wall time of the interpreter run in seconds, and `(self_us, cumulative_us, package)` entries of every
+        imported package.
+    """
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    wall_time = time.perf_counter() - start_time
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Failed to import '{module}':\n{process.stderr}")
+
+    entries = []
+
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, package = line[len("import time:"):].split("|", 2)
+        entries.append((int(self_us), int(cumulative_us), package.rstrip()[1:]))
+
+    return wall_time, entries
+
+
+def report_import_time(module: str, top: int = 20) -> None:
+    """
+    Print a startup time report of a module: total import time and the slowest imports by cumulative time.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to be imported, e.g. 'wsgi' or 'run'.
+    top : int
+        Number of slowest imports to be reported.
+    """
+    wall_time, entries = measure_import_time(module)
+    top_level = [entry for entry in entries if not entry[2].startswith(" ")]
+    total_us = sum(cumulative_us for _, cumulative_us, _ in top_level)
+
+    print(f"Startup report for '{module}':")
+    print(f"  Interpreter wall time: {wall_time * 1000:.1f} ms")
+    print(f"  Total import time: {total_us / 1000:.1f} ms ({len(entries)} modules)")
+    print(f"\n  {'cumulative [ms]':>15}  {'self [ms]':>9}  package")
+
+    for self_us, cumulative_us, package in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>15.1f}  {self_us / 1000:>9.1f}  {package.strip()}")
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from a2wsgi import WSGIMiddleware
+
+from source.system_settings import setup_logging, get_settings
+from source.utils import get_server_layout, get_request_threads
+from source.app import app as wsgi_app
+
+setup_logging(__name__)
+
+# ASGI entry point of the async serving mode, run by uvicorn workers under gunicorn (see `gunicorn.conf.py`).
+# Connections are handled by the event loop, while the Flask app runs in a thread pool sized like the gthread workers:
+# threads for the requests in flight, for the requests waiting for admission, and for shedding the excess.
+settings = get_settings()
+app = WSGIMiddleware(
+    wsgi_app,
+    workers=get_request_threads(settings.get('admission') or {}, get_server_layout(settings.get('server') or {})[1])
+)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from datetime import datetime, timezone
+from http.client import HTTPConnection
+from typing import Dict, List
+from urllib.parse import urlsplit
+import subprocess
+import threading
+import argparse
+import socket
+import time
+import json
+import sys
+import os
+
+from source.system_settings import get_settings
+from source.stats import percentile
+from source.utils import PROJECT_DIR
+
+
+def summarize(latencies: List[float], duration: float) -> dict:
+    """
+    Summarize request latencies.
+
+    Parameters
+    ----------
+    latencies : List[float]
+        Request latencies, in seconds.
+    duration : float
+        Measurement duration, in seconds.
+
+    Returns
+    -------
+    dict
+        Request count, requests per second and latency percentiles in milliseconds.
+    """
+    latencies = sorted(latencies)
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 2) if duration else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+
+
+def wait_for_server(host: str, port: int, timeout: float = 30.0) -> None:
+    """
+    Wait until the server accepts TCP connections.
+
+    Raises
+    ------
+    TimeoutError
+        If the server is not reachable within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1.0):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise TimeoutError(f"Server not reachable at {host}:{port} after {timeout} seconds.")
+
+
+def get_process_tree_memory(pid: int) -> int:
+    """
+    Get the resident memory of a process and its children, e.g. the gunicorn master and workers, from `/proc`.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID.
+
+    Returns
+    -------
+    int
+        Resident memory in bytes, or 0 if it is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/statm", mode="rt") as file:
+            memory = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+        with open(f"/proc/{pid}/task/{pid}/children", mode="rt") as file:
+            children = [int(child) for child in file.read().split()]
+    except (OSError, ValueError):
+        return 0
+
+    return memory + sum(get_process_tree_memory(child) for child in children)
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """
+    Start the app locally with the same gunicorn configuration as the Dockerfile.
+
+    Parameters
+    ----------
+    port : int
+        Local port to bind.
+
+    Returns
+    -------
+    subprocess.Popen
+        The gunicorn master process.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"],
+        cwd=PROJECT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    try:
+        wait_for_server("127.0.0.1", port)
+    except BaseException:
+        process.terminate()
+        process.wait(timeout=30)
+        raise
+
+    return process
+
+
+def run_load(
+        base_url: str,
+        paths: List[str],
+        concurrency: int,
+        duration: float,
+        warmup: float = 0.0,
+        headers: dict = None,
+        server_pid: int = None
+) -> dict:
+    """
+    Drive the server with a closed-loop load: each client sends a request as soon as the previous one completes,
+    cycling through the paths over a keep-alive connection.
+
+    Parameters
+    ----------
+    base_url : str
+        Server URL, e.g. 'http://127.0.0.1:8081'.
+    paths : List[str]
+        Request paths, e.g. ['/', '/hello?name=Alice'].
+    concurrency : int
+        Number of concurrent clients.
+    duration : float
+        Measurement duration, in seconds.
+    warmup : float
+        Warm-up duration before the measurement, in seconds. Requests sent during the warm-up are not recorded.
+    headers : dict
+        Additional request headers, e.g. `Accept-Encoding`.
+    server_pid : int
+        Process ID of a local server, to sample its memory during the measurement.
+
+    Returns
+    -------
+    dict
+        Overall and per-path results, status code counts, errors, bytes on the wire and server memory.
+    """
+    url = urlsplit(base_url)
+    start_time = time.perf_counter() + warmup
+    end_time = start_time + duration
+    latencies: Dict[str, List[float]] = {path: [] for path in paths}
+    status_codes: Dict[int, int] = {}
+    response_bytes = [0]
+    errors = [0]
+    lock = threading.Lock()
+
+    def client(offset: int) -> None:
+        connection = HTTPConnection(url.hostname, url.port, timeout=30)
+        local_latencies = {path: [] for path in paths}
+        local_status_codes = {}
+        local_bytes = 0
+        local_errors = 0
+        index = offset
+
+        while True:
+            path = paths[index % len(paths)]
+            index += 1
+            request_start = time.perf_counter()
+
+            if request_start >= end_time:
+                break
+
+            reused = connection.sock is not None
+
+            try:
+                connection.request("GET", path, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+                request_end = time.perf_counter()
+            except (OSError, ValueError):
+                connection.close()
+                connection = HTTPConnection(url.hostname, url.port, timeout=30)
+
+                # A kept-alive connection closed by the server, e.g. by a worker restarted after `max_requests`, is
+                # retried once on a new connection, as HTTP clients do for idempotent requests
+                if reused:
+                    index -= 1
+                elif request_start >= start_time:
+                    local_errors += 1
+
+                continue
+
+            if request_start >= start_time:
+                local_latencies[path].append(request_end - request_start)
+                local_status_codes[response.status] = local_status_codes.get(response.status, 0) + 1
+                local_bytes += len(body)
+
+        connection.close()
+
+        with lock:
+            for path, values in local_latencies.items():
+                latencies[path].extend(values)
+
+            for status, count in local_status_codes.items():
+                status_codes[status] = status_codes.get(status, 0) + count
+
+            response_bytes[0] += local_bytes
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    idle_memory = get_process_tree_memory(server_pid) if server_pid else 0
+    peak_memory = [idle_memory]
+    done = threading.Event()
+
+    def sample_memory() -> None:
+        while not done.wait(0.2):
+            peak_memory[0] = max(peak_memory[0], get_process_tree_memory(server_pid))
+
+    if server_pid:
+        threads.append(threading.Thread(target=sample_memory))
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads[:concurrency]:
+        thread.join()
+
+    done.set()
+
+    for thread in threads[concurrency:]:
+        thread.join()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    overall = summarize(all_latencies, duration)
+    overall['errors'] = errors[0]
+    # Response bodies are read as sent, so compressed bodies count their compressed size
+    overall['avg_response_bytes'] = round(response_bytes[0] / len(all_latencies), 1) if all_latencies else 0.0
+    overall['total_response_bytes'] = response_bytes[0]
+
+    results = {
+        'overall': overall,
+        'paths': {path: summarize(values, duration) for path, values in latencies.items()},
+        'status_codes': {str(status): count for status, count in sorted(status_codes.items())}
+    }
+
+    if server_pid:
+        # Memory growth under load divided by the requests in flight
+        results['server_memory'] = {
+            'idle_bytes': idle_memory,
+            'peak_bytes': peak_memory[0],
+            'per_request_bytes': round((peak_memory[0] - idle_memory) / concurrency)
+        }
+
+    return results
+
+
+def get_git_commit() -> str:
+    """
+    Get the current Git commit of the project, or an empty string outside a Git repository.
+    """
+    try:
+        process = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True
+        )
+        return process.stdout.strip() if process.returncode == 0 else ""
+    except OSError:
+        return ""
+
+
+def main() -> None:
+    """
+    Benchmark the API service under the gunicorn configuration of the Dockerfile and write the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the API service with a concurrent load generator.")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one, e.g. http://host:8080.")
+    parser.add_argument("--port", type=int, default=8081, help="Local port of the started server.")
+    parser.add_argument("--paths", nargs="+", default=["/", "/hello?name=Alice"], help="Request paths.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent clients.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measurement duration in seconds.")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Warm-up duration in seconds.")
+    parser.add_argument("--accept-encoding", help="Accept-Encoding request header, e.g. 'gzip' or 'br, gzip'.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON results filepath.")
+    args = parser.parse_args()
+
+    process = None if args.url else start_server(args.port)
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+
+    try:
+        results = run_load(
+            base_url, args.paths, args.concurrency, args.duration, warmup=args.warmup,
+            headers={'Accept-Encoding': args.accept_encoding} if args.accept_encoding else None,
+            server_pid=process.pid if process is not None else None
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': get_git_commit(),
+        'url': base_url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'accept_encoding': args.accept_encoding,
+        'server': get_settings().get('server') or {},
+        **results
+    }
+
+    output_filepath = os.path.join(PROJECT_DIR, args.output)
+
+    with open(output_filepath, mode="w") as file:
+        json.dump(report, file, indent=2)
+
+    overall = report['overall']
+    print(f"Requests: {overall['requests']} ({overall['errors']} errors), {overall['rps']} req/s")
+    print(f"Latency: p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms")
+    print(
+        f"Bytes on the wire: {overall['avg_response_bytes']} per response, {overall['total_response_bytes']} in total"
+    )
+
+    if 'server_memory' in report:
+        memory = report['server_memory']
+        print(f"Server memory: {memory['idle_bytes']} idle, {memory['peak_bytes']} peak, "
+              f"{memory['per_request_bytes']} per request in flight")
+
+    for path, summary in report['paths'].items():
+        print(f"  {path}: {summary['rps']} req/s, p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms")
+
+    print(f"Results written to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+# Gunicorn configuration, loaded with `gunicorn --config gunicorn.conf.py`.
+# The process layout is derived from the container's CPU quota and memory limit, so it follows the resources set in
+# `kubernetes/deployment.yaml`. Every value can be overridden in the `server` block of `assets/settings.yaml`.
+# Settings: https://docs.gunicorn.org/en/stable/settings.html
+
+import shutil
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from source.system_settings import get_settings  # noqa: E402
+from source.utils import (  # noqa: E402
+    get_cpu_limit, get_memory_limit, get_server_layout, get_admission_limits, get_request_threads
+)
+
+server_settings = get_settings().get('server') or {}
+server_mode = server_settings.get('mode', "threaded")
+
+if server_mode not in ("threaded", "async"):
+    raise ValueError(f"Invalid server mode: '{server_mode}'")
+
+cpu_limit = get_cpu_limit()
+memory_limit = get_memory_limit()
+
+# One worker per CPU bounded by the memory limit, and threads proportional to the CPUs shared by the workers
+workers, app_threads = get_server_layout(server_settings)
+
+# Admission control (see `source/admission.py`) runs at most `max_in_flight` requests per worker, and lets up to
+# `max_queue` more wait for a slot on extra threads, which are idle while waiting; a few more threads shed the excess
+# with a fast 503, as the requests beyond the threads would wait in the connection queue of the gthread worker
+admission_settings = get_settings().get('admission') or {}
+max_in_flight, max_queue = get_admission_limits(admission_settings, app_threads)
+threads = get_request_threads(admission_settings, app_threads)
+
+# Prometheus metrics of every worker are written to files in this directory and aggregated on `/metrics`. It must be
+# set before the app is loaded, and emptied so metrics of a previous run are not reported.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/dev/shm/prometheus" if os.path.isdir("/dev/shm") else "/tmp/prometheus"
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+if server_mode == "async":
+    # Connections are handled by the uvicorn event loop; Flask runs in the thread pool of `asgi.py`
+    wsgi_app = "asgi:app"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    # Each request is handled by one of the worker threads
+    wsgi_app = "wsgi:app"
+    worker_class = "gthread"
+
+# Load the app once in the master process, so workers fork with imports done and start faster
+preload_app = server_settings.get('preload_app', True)
+
+# Recycle workers after a number of requests, with jitter so they do not restart all at once
+max_requests = server_settings.get('max_requests', 1000)
+max_requests_jitter = server_settings.get('max_requests_jitter', 100)
+
+# Keep idle connections longer than the Google Cloud load balancer (600 seconds) to avoid 502 errors
+keepalive = server_settings.get('keepalive', 620)
+
+# Request timeout, and shutdown timeout below the pod's default termination grace period (30 seconds)
+timeout = server_settings.get('timeout', 30)
+graceful_timeout = server_settings.get('graceful_timeout', 25)
+
+# Worker heartbeat files in memory, as container disks can block
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def on_starting(server) -> None:
+    """
+    Log the process layout when gunicorn starts.
+    """
+    server.log.info(
+        f"Serving mode '{server_mode}': {workers} worker(s) x {max_in_flight} request(s) in flight "
+        f"+ {max_queue} waiting ({threads} threads, including shedding) "
+        f"(CPU limit: {cpu_limit:g}, memory limit: {memory_limit or 'none'})"
+    )
+
+
+def post_fork(server, worker) -> None:
+    """
+    Report the request capacity of a new worker to the saturation metric and readiness check.
+    """
+    from source.metrics import set_worker_capacity
+    from source.health import set_worker_threads
+
+    set_worker_capacity(max_in_flight)
+    set_worker_threads(max_in_flight)
+
+
+def post_worker_init(worker) -> None:
+    """
+    Warm up the app of a new worker, once every route is registered, before it accepts requests.
+    """
+    from source.app import app
+    from source.health import warm_up
+
+    warm_up(app)
+
+
+def child_exit(server, worker) -> None:
+    """
+    Remove the live gauges of an exited worker from the aggregated metrics.
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import Callable, Iterable, Optional
+import threading
+import time
+
+from flask import Flask
+from prometheus_client import Counter, Gauge, Histogram
+from werkzeug.wsgi import ClosingIterator
+
+from source.system_settings import get_settings
+from source.utils import get_server_layout, get_admission_limits
+from source.health import get_health_paths, add_readiness_check
+from source.metrics import get_metrics_path
+
+ADMISSION_QUEUE = Gauge(
+    "app_admission_queue_length", "Number of HTTP requests waiting for admission.", multiprocess_mode="livesum"
+)
+ADMISSION_REJECTIONS = Counter(
+    "app_admission_rejections", "Number of HTTP requests shed with 503 by admission control.", ["reason"]
+)
+ADMISSION_WAIT = Histogram(
+    "app_admission_wait_seconds", "Time HTTP requests waited for admission in seconds.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class AdmissionControl:
+    """
+    WSGI middleware limiting the number of requests run concurrently by a worker process.
+
+    Up to `max_in_flight` requests run at once, and up to `max_queue` more wait at most `queue_timeout` seconds for
+    a slot. Requests beyond the queue, or waiting too long, are shed right away with `503 Service Unavailable` and a
+    `Retry-After` header, so a spike costs clients a fast retry instead of slowing down every request until the
+    autoscaler adds pods. Health checks and metrics are always admitted.
+
+    Parameters
+    ----------
+    app : Callable
+        WSGI app.
+    max_in_flight : int
+        Maximum number of requests running at once.
+    max_queue : int
+        Maximum number of requests waiting for a slot.
+    queue_timeout : float
+        Maximum time in seconds a request waits for a slot.
+    retry_after : int
+        Seconds clients are told to wait before retrying a shed request.
+    exempt_paths : Iterable[str]
+        Paths always admitted, e.g. the health checks.
+    """
+
+    def __init__(
+            self,
+            app: Callable,
+            max_in_flight: int,
+            max_queue: int,
+            queue_timeout: float = 1.0,
+            retry_after: int = 1,
+            exempt_paths: Iterable[str] = ()
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.exempt_paths = frozenset(exempt_paths)
+        self.waiting = 0
+        self.last_rejection = float("-inf")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+    def is_overloaded(self) -> Optional[str]:
+        """
+        Check whether the worker is shedding requests: its queue is full, or it shed a request in the last
+        `retry_after` seconds.
+
+        Returns
+        -------
+        Optional[str]
+            Reason of the overload, or None if the worker is not overloaded.
+        """
+        if self.max_queue and self.waiting >= self.max_queue:
+            return "Admission queue full"
+
+        if time.monotonic() - self.last_rejection < self.retry_after:
+            return "Shedding requests"
+
+        return None
+
+    def _reject(self, reason: str, start_response: Callable) -> Iterable[bytes]:
+        self.last_rejection = time.monotonic()
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        body = b"Service overloaded, retry later."
+        start_response("503 Service Unavailable", [
+            ("Content-Type", "text/plain; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(self.retry_after))
+        ])
+
+        return [body]
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        if environ.get("PATH_INFO") in self.exempt_paths:
+            return self.app(environ, start_response)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_queue:
+                    return self._reject("queue_full", start_response)
+
+                self.waiting += 1
+
+            ADMISSION_QUEUE.inc()
+            start_time = time.perf_counter()
+
+            try:
+                admitted = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+                ADMISSION_QUEUE.dec()
+                ADMISSION_WAIT.observe(time.perf_counter() - start_time)
+
+            if not admitted:
+                return self._reject("timeout", start_response)
+
+        try:
+            # The slot is released once the response is sent, including streamed responses
+            return ClosingIterator(self.app(environ, start_response), self._slots.release)
+        except BaseException:
+            self._slots.release()
+            raise
+
+
+def init_admission(app: Flask) -> Optional[AdmissionControl]:
+    """
+    Wrap a Flask app with admission control, configured in the `admission` block of `settings.yaml`, and report the
+    app as not ready while it sheds requests.
+
+    Parameters
+    ----------
+    app : Flask
+        Flask app.
+
+    Returns
+    -------
+    Optional[AdmissionControl]
+        The admission control middleware, or None if it is disabled.
+    """
+    settings = get_settings()
+    admission_settings = settings.get('admission') or {}
+
+    if not admission_settings.get('enabled', True):
+        return None
+
+    _, threads = get_server_layout(settings.get('server') or {})
+    max_in_flight, max_queue = get_admission_limits(admission_settings, threads)
+    admission = AdmissionControl(
+        app.wsgi_app,
+        max_in_flight=max_in_flight,
+        max_queue=max_queue,
+        queue_timeout=admission_settings.get('queue_timeout', 1.0),
+        retry_after=admission_settings.get('retry_after', 1),
+        exempt_paths=[*get_health_paths(), get_metrics_path()]
+    )
+    app.wsgi_app = admission
+    add_readiness_check(admission.is_overloaded)
+
+    return admission
@@ -5,13 +5,22 @@
 # https://github.com/joao8tunes
 
 import logging
-from flask import Flask, request
+from flask import Flask, Response, request
 
 from source.system_settings import setup_logging
+from source.metrics import init_metrics
+from source.health import init_health
+from source.cache import cached
+from source.compression import init_compression, stream_json
+from source.admission import init_admission
 
 
 setup_logging(__name__)
 app = Flask(__name__)
+init_metrics(app)
+init_health(app)
+init_compression(app)
+init_admission(app)
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -42,9 +51,11 @@ def home() -> str:
 
 
 @app.route('/hello', methods=['GET', 'POST'])
+@cached(ttl=60)
 def hello_world() -> str:
     """
-    Handle GET requests to the root endpoint.
+    Handle GET requests to the hello endpoint.
+    Cached view: GET responses are served from the response cache for 60 seconds per query string.
 
     Parameters
     ----------
@@ -70,3 +81,29 @@ def hello_world() -> str:
     logging.debug("Waiting for another HTTP request before running again...")
 
     return message
+
+
+@app.route('/numbers', methods=['GET'])
+def numbers() -> Response:
+    """
+    Handle GET requests to the numbers endpoint, as an example of a large response.
+    Streamed view: the JSON array is generated and sent a chunk at a time, so it is never fully held in memory.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    Response
+        A JSON array of the integers from 0 to the 'count' parameter of the query string (1000 if not provided),
+        limited to 1000000.
+
+    Examples
+    --------
+    >>> client.get('/numbers?count=3')
+    b'[0,1,2]'
+    """
+    count = min(request.args.get('count', 1000, type=int), 1000000)
+
+    return stream_json(range(count))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from typing import Callable, Optional
+from urllib.parse import urlencode
+import threading
+import hashlib
+import inspect
+import time
+
+from flask import Response, current_app, request
+from prometheus_client import Counter, Gauge
+
+from source.system_settings import get_settings
+
+CachedResponse = namedtuple("CachedResponse", ["body", "status", "headers", "etag"])
+
+CACHE_EVENTS = Counter(
+    "app_response_cache_events", "Response cache hits, misses, evictions and expirations.", ["cache", "event"]
+)
+CACHE_SIZE = Gauge(
+    "app_response_cache_bytes", "Size of the cached response bodies in bytes.", ["cache"],
+    multiprocess_mode="livesum"
+)
+
+_cache_settings = get_settings().get('cache') or {}
+_default_cache = {'instance': None}
+_default_cache_lock = threading.Lock()
+
+
+class LRUCache:
+    """
+    In-process cache with a time to live per entry, evicting the least recently used entries beyond a number of
+    entries or a total size. It is thread-safe, and each worker process has its own entries.
+
+    Any object with the same `get` and `set` methods can be used as a cache backend of `cached`, e.g. an adapter to a
+    shared cache such as Redis.
+
+    Parameters
+    ----------
+    name : str
+        Cache name used in the metrics.
+    max_entries : int
+        Maximum number of entries.
+    max_bytes : int
+        Maximum total size of the entries in bytes.
+    """
+
+    def __init__(self, name: str = "default", max_entries: int = 1024, max_bytes: int = 16 * 1024 ** 2):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self._evictions = CACHE_EVENTS.labels(name, "eviction")
+        self._expirations = CACHE_EVENTS.labels(name, "expiration")
+        self._size = CACHE_SIZE.labels(name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Get the value of a key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self._expirations.inc()
+                self._size.set(self.bytes)
+                return None
+
+            self._entries.move_to_end(key)
+
+            return entry[2]
+
+    def set(self, key: str, value, size: int, ttl: float) -> None:
+        """
+        Set the value of a key for `ttl` seconds. Values larger than the cache are not stored.
+        """
+        if size > self.max_bytes or ttl <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions.inc()
+
+            self._size.set(self.bytes)
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self._size.set(0)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+def get_default_cache() -> LRUCache:
+    """
+    Get the response cache shared by the views, bounded by the `cache` block of `settings.yaml`.
+    """
+    with _default_cache_lock:
+        if _default_cache['instance'] is None:
+            _default_cache['instance'] = LRUCache(
+                max_entries=_cache_settings.get('max_entries', 1024),
+                max_bytes=_cache_settings.get('max_bytes', 16 * 1024 ** 2)
+            )
+
+        return _default_cache['instance']
+
+
+def get_cache_key() -> str:
+    """
+    Build the cache key of the current request from its method, path and query string arguments in sorted order,
+    so `?a=1&b=2` and `?b=2&a=1` share an entry. HEAD requests share the entries of GET requests.
+    """
+    method = "GET" if request.method == "HEAD" else request.method
+    args = urlencode(sorted(request.args.items(multi=True)))
+
+    return f"{method} {request.path}?{args}"
+
+
+def _build_response(cached_response: CachedResponse, ttl: float, etag: bool) -> Response:
+    response = Response(cached_response.body, status=cached_response.status, headers=cached_response.headers)
+
+    if etag:
+        response.set_etag(cached_response.etag)
+
+    if ttl and _cache_settings.get('cache_control', True):
+        response.cache_control.public = True
+        response.cache_control.max_age = int(ttl)
+
+    # Answer with 304 Not Modified if the client already has this version
+    return response.make_conditional(request)
+
+
+def cached(ttl: float = None, cache=None, etag: bool = True) -> Callable:
+    """
+    Cache the responses of a view whose output only depends on its method, path and query string.
+
+    Only successful, non-streamed GET and HEAD responses without cookies are cached. Cached responses are served
+    without calling the view, so it neither runs nor logs on a hit. Works with sync and async views.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds a response is cached. Defaults to `default_ttl` of the `cache` block of `settings.yaml`.
+    cache : object
+        Cache backend with the `get` and `set` methods of `LRUCache`. Defaults to the shared in-process cache.
+    etag : bool
+        Add an `ETag` header and answer conditional requests with `304 Not Modified`.
+
+    Returns
+    -------
+    Callable
+        View decorator.
+
+    Examples
+    --------
+    >>> @app.route('/hello')
+    ... @cached(ttl=60)
+    ... def hello_world() -> str:
+    ...     return f"Hello {request.args.get('name', 'World')}!"
+    """
+    ttl = _cache_settings.get('default_ttl', 60) if ttl is None else ttl
+
+    def decorator(view: Callable) -> Callable:
+        def lookup() -> Optional[Response]:
+            if not _cache_settings.get('enabled', True) or request.method not in ("GET", "HEAD"):
+                return None
+
+            backend = cache if cache is not None else get_default_cache()
+            cached_response = backend.get(get_cache_key())
+            event = "miss" if cached_response is None else "hit"
+            CACHE_EVENTS.labels(getattr(backend, 'name', "default"), event).inc()
+
+            return None if cached_response is None else _build_response(cached_response, ttl, etag)
+
+        def store(result) -> Response:
+            response = current_app.make_response(result)
+
+            if (
+                not _cache_settings.get('enabled', True) or request.method not in ("GET", "HEAD")
+                or response.status_code != 200 or response.is_streamed or "Set-Cookie" in response.headers
+            ):
+                return response
+
+            body = response.get_data()
+            cached_response = CachedResponse(
+                body=body,
+                status=response.status_code,
+                headers=[(name, value) for name, value in response.headers if name != "Content-Length"],
+                etag=hashlib.sha1(body).hexdigest()
+            )
+            (cache if cache is not None else get_default_cache()).set(get_cache_key(), cached_response, len(body), ttl)
+
+            return _build_response(cached_response, ttl, etag)
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(*args, **kwargs):
+                response = lookup()
+
+                return store(await view(*args, **kwargs)) if response is None else response
+        else:
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                response = lookup()
+
+                return store(view(*args, **kwargs)) if response is None else response
+
+        return wrapper
+
+    return decorator
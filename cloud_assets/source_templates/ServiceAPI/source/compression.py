@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import Callable, Iterable, Iterator, Optional
+import json
+import zlib
+
+from flask import Flask, Response, request, stream_with_context
+
+from source.system_settings import get_settings
+
+_compression_settings = get_settings().get('compression') or {}
+_compressible_types = frozenset(_compression_settings.get('mimetypes') or (
+    "text/plain", "text/html", "text/css", "text/csv", "application/json", "application/x-ndjson",
+    "application/javascript", "application/xml"
+))
+
+
+def _load_brotli():
+    """
+    Import brotli if installed, so compression falls back to gzip without it.
+    """
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+_brotli = _load_brotli()
+
+
+def get_encoding() -> Optional[str]:
+    """
+    Negotiate the content encoding of the current request from its `Accept-Encoding` header, preferring brotli.
+
+    Returns
+    -------
+    Optional[str]
+        "br", "gzip", or None if the client accepts neither.
+    """
+    encodings = ["br", "gzip"] if _brotli else ["gzip"]
+
+    return request.accept_encodings.best_match(encodings)
+
+
+def get_compressor(encoding: str) -> Callable[[Optional[bytes]], bytes]:
+    """
+    Create an incremental compressor: called with a chunk it returns the compressed bytes available so far, and
+    called with None it returns the remaining bytes.
+
+    Parameters
+    ----------
+    encoding : str
+        "br" or "gzip".
+
+    Returns
+    -------
+    Callable[[Optional[bytes]], bytes]
+        Compressor function.
+    """
+    if encoding == "br":
+        compressor = _brotli.Compressor(quality=_compression_settings.get('brotli_quality', 5))
+
+        def compress(chunk: Optional[bytes]) -> bytes:
+            return compressor.finish() if chunk is None else compressor.process(chunk)
+    else:
+        compressor = zlib.compressobj(_compression_settings.get('gzip_level', 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+        def compress(chunk: Optional[bytes]) -> bytes:
+            return compressor.flush() if chunk is None else compressor.compress(chunk)
+
+    return compress
+
+
+def _compress_stream(chunks: Iterable[bytes], compress: Callable[[Optional[bytes]], bytes]) -> Iterator[bytes]:
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+
+            if data:
+                yield data
+
+        yield compress(None)
+    finally:
+        # Close the wrapped stream, which ends its request context
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _compress_response(response: Response) -> Response:
+    if (
+        response.status_code < 200 or response.status_code in (204, 304) or request.method == "HEAD"
+        or "Content-Encoding" in response.headers or response.mimetype not in _compressible_types
+        or response.cache_control.no_transform
+    ):
+        return response
+
+    if not response.is_streamed and response.content_length is not None:
+        if response.content_length < _compression_settings.get('min_size', 1024):
+            return response
+
+    encoding = get_encoding()
+    response.vary.add("Accept-Encoding")
+
+    if encoding is None:
+        return response
+
+    compress = get_compressor(encoding)
+
+    if response.is_streamed:
+        # Compressed chunk by chunk, so the body is never buffered in the worker
+        response.response = _compress_stream(response.response, compress)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compress(response.get_data()) + compress(None))
+
+    response.headers["Content-Encoding"] = encoding
+
+    # The compressed body differs byte by byte, so a strong ETag of the uncompressed body becomes weak
+    etag, weak = response.get_etag()
+
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def stream_json(items: Iterable, mimetype: str = "application/json", chunk_size: int = 8192) -> Response:
+    """
+    Stream an iterable as a JSON array, a few items at a time, so large results are never fully built nor buffered in
+    memory. Streamed responses are compressed chunk by chunk.
+
+    Parameters
+    ----------
+    items : Iterable
+        JSON-serializable items, e.g. a generator over the rows of a query.
+    mimetype : str
+        Response mimetype.
+    chunk_size : int
+        Approximate size in bytes of the chunks written to the client.
+
+    Returns
+    -------
+    Response
+        Streamed response.
+
+    Examples
+    --------
+    >>> @app.route('/numbers')
+    ... def numbers() -> Response:
+    ...     return stream_json(range(1000000))
+    """
+    def generate() -> Iterator[str]:
+        parts = ["["]
+        size = 1
+        separator = ""
+
+        for item in items:
+            part = separator + json.dumps(item)
+            separator = ","
+            parts.append(part)
+            size += len(part)
+
+            if size >= chunk_size:
+                yield "".join(parts)
+                parts = []
+                size = 0
+
+        parts.append("]")
+        yield "".join(parts)
+
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def init_compression(app: Flask) -> None:
+    """
+    Compress the responses of a Flask app with brotli or gzip, as negotiated with the client.
+
+    Only responses of compressible types larger than `min_size` bytes are compressed, and streamed responses are
+    compressed chunk by chunk. Brotli is used when the `brotli` package is installed.
+
+    Parameters
+    ----------
+    app : Flask
+        Flask app.
+    """
+    if _compression_settings.get('enabled', True):
+        app.after_request(_compress_response)
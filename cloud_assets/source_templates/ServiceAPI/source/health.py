@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import Callable, List, Optional
+import threading
+import logging
+import time
+
+from flask import Flask, Response, request
+
+from source.system_settings import get_settings
+
+# WSGI environment key set on warm-up requests, which are not counted by the metrics
+WARMUP_ENVIRON_KEY = "app.warmup"
+
+# Paths of the health checks, fixed as they are also set in the probes of the deployment and in the endpoint spec
+HEALTH_PATHS = {
+    'readiness': "/health-check",
+    'liveness': "/health-check/live",
+    'startup': "/health-check/startup"
+}
+
+_health_settings = get_settings().get('health') or {}
+_health_state = {'warm': False, 'threads': None, 'in_flight': 0}
+_health_lock = threading.Lock()
+_readiness_checks = []
+
+
+def get_health_paths() -> List[str]:
+    """
+    Get the paths of the health checks.
+    """
+    return list(HEALTH_PATHS.values())
+
+
+def add_readiness_check(check: Callable[[], Optional[str]]) -> None:
+    """
+    Add a check to the readiness probe, e.g. of a subsystem that can be overloaded.
+
+    Parameters
+    ----------
+    check : Callable[[], Optional[str]]
+        Function returning the reason why the app is not ready, or None if it is ready.
+    """
+    _readiness_checks.append(check)
+
+
+def set_worker_threads(threads: int) -> None:
+    """
+    Set the number of threads of the current worker process, called by gunicorn after forking it.
+
+    Parameters
+    ----------
+    threads : int
+        Number of threads handling HTTP requests.
+    """
+    _health_state['threads'] = threads
+
+
+def is_saturated() -> bool:
+    """
+    Check whether the busy threads of the current worker reached the `max_saturation` fraction set in
+    `settings.yaml`. Always False when the number of threads is unknown, e.g. with the development server.
+    """
+    threads = _health_state['threads']
+
+    if not threads:
+        return False
+
+    return _health_state['in_flight'] >= threads * _health_settings.get('max_saturation', 1.0)
+
+
+def warm_up(app: Flask) -> None:
+    """
+    Request the warm-up paths set in `settings.yaml` once, so lazy imports, caches and connections are ready before
+    the pod receives traffic, then report the app as started.
+
+    It sends requests through the app, after which Flask accepts no new routes, so it is run by the server entry
+    points once every route is registered: the `post_worker_init` hook of `gunicorn.conf.py` in each worker, and
+    `wsgi.py` with the development server.
+
+    Parameters
+    ----------
+    app : Flask
+        Flask app to be warmed up.
+    """
+    start_time = time.perf_counter()
+    client = app.test_client()
+
+    for path in _health_settings.get('warmup_paths') or []:
+        response = client.get(path, environ_base={WARMUP_ENVIRON_KEY: True})
+        response.close()
+
+        if response.status_code >= 500:
+            logging.warning(f"Warm-up request to '{path}' failed with status {response.status_code}.")
+
+    _health_state['warm'] = True
+    logging.debug(f"App warmed up in {time.perf_counter() - start_time:.3f} seconds.")
+
+
+def _before_request() -> None:
+    if request.path not in HEALTH_PATHS.values():
+        with _health_lock:
+            _health_state['in_flight'] += 1
+
+
+def _teardown_request(exception: BaseException = None) -> None:
+    if request.path not in HEALTH_PATHS.values():
+        with _health_lock:
+            _health_state['in_flight'] -= 1
+
+
+def _readiness_view() -> Response:
+    if not _health_state['warm']:
+        return Response("Warming up", status=503, mimetype="text/plain")
+
+    if is_saturated():
+        return Response("Saturated", status=503, mimetype="text/plain")
+
+    for check in _readiness_checks:
+        reason = check()
+
+        if reason:
+            return Response(reason, status=503, mimetype="text/plain")
+
+    return Response("OK", mimetype="text/plain")
+
+
+def _liveness_view() -> Response:
+    return Response("OK", mimetype="text/plain")
+
+
+def _startup_view() -> Response:
+    if not _health_state['warm']:
+        return Response("Warming up", status=503, mimetype="text/plain")
+
+    return Response("OK", mimetype="text/plain")
+
+
+def init_health(app: Flask) -> None:
+    """
+    Add the health check routes of the Kubernetes probes to a Flask app. They do not log, and only read in-memory
+    state, so frequent probes cost nothing.
+
+    - Liveness: the worker answers requests.
+    - Startup: the app finished its warm-up (see `warm_up`).
+    - Readiness: the app is warm, the worker has free threads and every check added with `add_readiness_check`
+      passes, so traffic is only routed to pods that can serve it at full speed. It is also the health check of the
+      GKE load balancer.
+
+    Parameters
+    ----------
+    app : Flask
+        Flask app.
+    """
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule(HEALTH_PATHS['readiness'], "health_readiness", _readiness_view)
+    app.add_url_rule(HEALTH_PATHS['liveness'], "health_liveness", _liveness_view)
+    app.add_url_rule(HEALTH_PATHS['startup'], "health_startup", _startup_view)
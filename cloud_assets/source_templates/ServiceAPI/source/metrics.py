@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import Iterable, Iterator
+import resource
+import time
+import os
+
+from flask import Flask, Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily, Metric
+
+from source.system_settings import get_settings, get_logging_stats
+from source.health import WARMUP_ENVIRON_KEY
+
+# Metrics are aggregated across gunicorn worker processes when `gunicorn.conf.py` sets this directory
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+_metrics_settings = get_settings().get('metrics') or {}
+_latency_buckets = _metrics_settings.get('latency_buckets') or Histogram.DEFAULT_BUCKETS
+_memory_interval = _metrics_settings.get('memory_interval', 5)
+_sample_state = {'pid': None, 'next_update': 0.0, 'dropped_records': 0, 'failed_batches': 0}
+
+REQUESTS = Counter(
+    "app_http_requests", "Number of HTTP requests handled.", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "app_http_request_duration_seconds", "HTTP request latency in seconds.", ["method", "route"],
+    buckets=_latency_buckets
+)
+IN_FLIGHT = Gauge(
+    "app_http_requests_in_flight", "Number of HTTP requests being handled.", multiprocess_mode="livesum"
+)
+THREAD_CAPACITY = Gauge(
+    "app_worker_threads", "Number of threads handling HTTP requests.", multiprocess_mode="livesum"
+)
+MEMORY_USAGE = Gauge(
+    "app_worker_resident_memory_bytes", "Resident memory of the worker processes in bytes.",
+    multiprocess_mode="livesum"
+)
+LOGGING_QUEUE_DEPTH = Gauge(
+    "app_logging_queue_depth", "Number of log records waiting in the logging queues.", multiprocess_mode="livesum"
+)
+LOGGING_DROPPED = Counter(
+    "app_logging_dropped_records", "Number of log records dropped by a full logging queue or log transport buffer, "
+    "or in a failed log batch."
+)
+LOGGING_FAILED_BATCHES = Counter(
+    "app_logging_failed_batches", "Number of log batches the log transport failed to write."
+)
+
+
+class SaturationCollector:
+    """
+    Collector adding the thread saturation, the ratio of in-flight requests to threads, to the metrics of a source
+    collector. It is derived at scrape time, so requests pay nothing for it.
+
+    Parameters
+    ----------
+    source : object
+        Collector or registry of the in-flight and thread capacity gauges.
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def collect(self) -> Iterator[Metric]:
+        metrics = list(self.source.collect())
+        yield from metrics
+
+        in_flight = _sum_samples(metrics, "app_http_requests_in_flight")
+        capacity = _sum_samples(metrics, "app_worker_threads")
+
+        if capacity:
+            yield GaugeMetricFamily(
+                "app_thread_saturation_ratio", "Ratio of in-flight HTTP requests to threads.",
+                value=in_flight / capacity
+            )
+
+
+def _sum_samples(metrics: Iterable[Metric], name: str) -> float:
+    """
+    Sum the sample values of a metric.
+    """
+    return sum(sample.value for metric in metrics if metric.name == name for sample in metric.samples)
+
+
+def get_memory_usage() -> int:
+    """
+    Get the resident memory of the current process in bytes, from `/proc` on Linux or its peak elsewhere.
+    """
+    try:
+        with open("/proc/self/statm", mode="rt") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_metrics_path() -> str:
+    """
+    Get the path of the metrics endpoint.
+    """
+    return _metrics_settings.get('path', "/metrics")
+
+
+def set_worker_capacity(threads: int) -> None:
+    """
+    Set the number of threads of the current worker process, called by gunicorn after forking it.
+
+    Parameters
+    ----------
+    threads : int
+        Number of threads handling HTTP requests.
+    """
+    THREAD_CAPACITY.set(threads)
+
+
+def _sample_process_metrics(pid: int, now: float) -> None:
+    """
+    Sample the resident memory and the logging statistics of the worker process. The logging counters grow by the
+    records dropped since the previous sample, so the ones inherited from the gunicorn master are not counted.
+    """
+    stats = get_logging_stats()
+    dropped_records = stats['dropped_records'] + stats['transport']['dropped_records']
+    failed_batches = stats['transport']['failed_batches']
+
+    if _sample_state['pid'] == pid:
+        LOGGING_DROPPED.inc(max(0, dropped_records - _sample_state['dropped_records']))
+        LOGGING_FAILED_BATCHES.inc(max(0, failed_batches - _sample_state['failed_batches']))
+
+    _sample_state.update(
+        pid=pid, next_update=now + _memory_interval, dropped_records=dropped_records, failed_batches=failed_batches
+    )
+    MEMORY_USAGE.set(get_memory_usage())
+    LOGGING_QUEUE_DEPTH.set(stats['queue_depth'])
+
+
+def generate_metrics() -> bytes:
+    """
+    Generate the metrics in the Prometheus text format, aggregated across worker processes if enabled.
+    """
+    registry = CollectorRegistry()
+
+    if MULTIPROCESS:
+        registry.register(SaturationCollector(multiprocess.MultiProcessCollector(None)))
+    else:
+        registry.register(SaturationCollector(REGISTRY))
+
+    return generate_latest(registry)
+
+
+def _metrics_view() -> Response:
+    return Response(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
+def _before_request() -> None:
+    if request.environ.get(WARMUP_ENVIRON_KEY):
+        return
+
+    g.metrics_start_time = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _after_request(response: Response) -> Response:
+    g.metrics_status = response.status_code
+
+    return response
+
+
+def _teardown_request(exception: BaseException = None) -> None:
+    start_time = g.pop('metrics_start_time', None)
+
+    if start_time is None:
+        return
+
+    now = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    IN_FLIGHT.dec()
+    REQUEST_LATENCY.labels(request.method, route).observe(now - start_time)
+    REQUESTS.labels(request.method, route, g.pop('metrics_status', 500)).inc()
+
+    # Memory and logging statistics are sampled periodically, as reading them costs more than the rest of the
+    # instrumentation
+    pid = os.getpid()
+
+    if _sample_state['pid'] != pid or now >= _sample_state['next_update']:
+        _sample_process_metrics(pid, now)
+
+
+def init_metrics(app: Flask) -> None:
+    """
+    Instrument a Flask app with Prometheus metrics and expose them on the path set in `settings.yaml`.
+
+    Every request updates the request counter, the per-route latency histogram and the in-flight gauge. Routes are
+    labelled by their URL rule (e.g. `/users/<id>`), so the number of series stays bounded.
+
+    Parameters
+    ----------
+    app : Flask
+        Flask app to be instrumented.
+    """
+    if not _metrics_settings.get('enabled', True):
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule(get_metrics_path(), "metrics", _metrics_view)
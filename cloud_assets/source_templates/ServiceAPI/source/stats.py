@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from typing import List
+import math
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Compute a percentile of sorted values with the nearest-rank method.
+
+    Parameters
+    ----------
+    sorted_values : List[float]
+        Values in ascending order.
+    fraction : float
+        Percentile as a fraction, e.g. 0.95.
+
+    Returns
+    -------
+    float
+        The percentile value, or 0.0 if there are no values.
+
+    Examples
+    --------
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+    2.0
+    >>> percentile(list(range(1, 101)), 0.95)
+    95
+    """
+    if not sorted_values:
+        return 0.0
+
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+
+    return sorted_values[index]
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from math import ceil
+from typing import List, Optional, Tuple
+import subprocess
+import time
+import sys
+import os
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+CGROUP_DIR = "/sys/fs/cgroup"
+
+
+def _read_cgroup_file(*path: str) -> Optional[str]:
+    """
+    Read a cgroup file, returning None if it does not exist.
+    """
+    try:
+        with open(os.path.join(CGROUP_DIR, *path), mode="rt") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def get_cpu_limit() -> float:
+    """
+    Get the number of CPUs available to the container, from its cgroup CPU quota (v2 or v1), falling back to the
+    CPUs the process can run on.
+
+    Returns
+    -------
+    float
+        Number of CPUs, possibly fractional (e.g. 0.5 for a `500m` limit).
+    """
+    available_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    cpu_max = _read_cgroup_file("cpu.max")  # cgroup v2: "<quota> <period>" or "max <period>"
+
+    if cpu_max:
+        quota, period = cpu_max.split()
+        quota = None if quota == "max" else int(quota)
+        period = int(period)
+    else:  # cgroup v1
+        quota = _read_cgroup_file("cpu", "cpu.cfs_quota_us")
+        period = _read_cgroup_file("cpu", "cpu.cfs_period_us")
+        quota = int(quota) if quota and int(quota) > 0 else None
+        period = int(period) if period else None
+
+    if quota and period:
+        return min(quota / period, available_cpus)
+
+    return float(available_cpus)
+
+
+def get_memory_limit() -> Optional[int]:
+    """
+    Get the memory limit of the container, from its cgroup (v2 or v1).
+
+    Returns
+    -------
+    Optional[int]
+        Memory limit in bytes, or None if there is no limit.
+    """
+    memory_max = _read_cgroup_file("memory.max")  # cgroup v2
+
+    if memory_max is None:
+        memory_max = _read_cgroup_file("memory", "memory.limit_in_bytes")  # cgroup v1
+
+    if not memory_max or memory_max == "max":
+        return None
+
+    memory_max = int(memory_max)
+
+    # cgroup v1 reports an unlimited memory as a huge page-aligned number
+    return memory_max if memory_max < 2 ** 60 else None
+
+
+def measure_import_time(module: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """
+    Import a module in a fresh interpreter with `python -X importtime` and collect the import times.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to be imported, e.g. 'wsgi' or 'run'.
+
+    Returns
+    -------
+    Tuple[float, List[Tuple[int, int, str]]]
+        Wall time of the interpreter run in seconds, and `(self_us, cumulative_us, package)` entries of every
+        imported package.
+    """
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    wall_time = time.perf_counter() - start_time
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Failed to import '{module}':\n{process.stderr}")
+
+    entries = []
+
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, package = line[len("import time:"):].split("|", 2)
+        entries.append((int(self_us), int(cumulative_us), package.rstrip()[1:]))
+
+    return wall_time, entries
+
+
+def report_import_time(module: str, top: int = 20) -> None:
+    """
+    Print a startup time report of a module: total import time and the slowest imports by cumulative time.
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to be imported, e.g. 'wsgi' or 'run'.
+    top : int
+        Number of slowest imports to be reported.
+    """
+    wall_time, entries = measure_import_time(module)
+    top_level = [entry for entry in entries if not entry[2].startswith(" ")]
+    total_us = sum(cumulative_us for _, cumulative_us, _ in top_level)
+
+    print(f"Startup report for '{module}':")
+    print(f"  Interpreter wall time: {wall_time * 1000:.1f} ms")
+    print(f"  Total import time: {total_us / 1000:.1f} ms ({len(entries)} modules)")
+    print(f"\n  {'cumulative [ms]':>15}  {'self [ms]':>9}  package")
+
+    for self_us, cumulative_us, package in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>15.1f}  {self_us / 1000:>9.1f}  {package.strip()}")
+
+
+def get_server_layout(server_settings: dict) -> Tuple[int, int]:
+    """
+    Get the number of gunicorn worker processes and threads per worker, resolving "auto" values from the container
+    CPU quota and memory limit.
+
+    Parameters
+    ----------
+    server_settings : dict
+        The `server` block of `settings.yaml`.
+
+    Returns
+    -------
+    Tuple[int, int]
+        Number of worker processes and number of threads per worker.
+    """
+    cpu_limit = get_cpu_limit()
+    memory_limit = get_memory_limit()
+
+    # One worker process per CPU, as long as every worker fits in the memory limit
+    workers = server_settings.get('workers', "auto")
+
+    if workers == "auto":
+        workers = max(1, ceil(cpu_limit))
+
+        if memory_limit:
+            worker_memory = server_settings.get('worker_memory_mb', 128) * 1024 ** 2
+            workers = max(1, min(workers, memory_limit // worker_memory))
+
+    # Threads per worker, proportional to the CPUs shared by the workers
+    threads = server_settings.get('threads', "auto")
+
+    if threads == "auto":
+        threads = max(1, round(server_settings.get('threads_per_cpu', 8) * cpu_limit / workers))
+
+    return int(workers), int(threads)
+
+
+def get_admission_limits(admission_settings: dict, threads: int) -> Tuple[int, int]:
+    """
+    Get the maximum number of requests in flight and waiting per worker process, resolving "auto" values from the
+    number of threads of the worker.
+
+    Parameters
+    ----------
+    admission_settings : dict
+        The `admission` block of `settings.yaml`.
+    threads : int
+        Number of threads per worker running the app.
+
+    Returns
+    -------
+    Tuple[int, int]
+        Maximum number of requests in flight and maximum number of waiting requests, which is 0 if admission control
+        is disabled.
+    """
+    if not admission_settings.get('enabled', True):
+        return threads, 0
+
+    max_in_flight = admission_settings.get('max_in_flight', "auto")
+    max_in_flight = threads if max_in_flight == "auto" else int(max_in_flight)
+
+    max_queue = admission_settings.get('max_queue', "auto")
+    max_queue = max_in_flight if max_queue == "auto" else int(max_queue)
+
+    return max_in_flight, max_queue
+
+
+def get_request_threads(admission_settings: dict, threads: int) -> int:
+    """
+    Get the number of threads per worker process handling requests: the requests in flight, the requests waiting for
+    admission, and `shed_threads` more answering the excess with a fast `503`. Without them, every thread is taken by
+    the running and waiting requests, so the excess waits in the connection queue of the server instead of being shed.
+
+    Parameters
+    ----------
+    admission_settings : dict
+        The `admission` block of `settings.yaml`.
+    threads : int
+        Number of threads per worker running the app.
+
+    Returns
+    -------
+    int
+        Number of request threads per worker.
+
+    Examples
+    --------
+    >>> get_request_threads({'max_in_flight': 8, 'max_queue': 8, 'shed_threads': 4}, 8)
+    20
+    """
+    max_in_flight, max_queue = get_admission_limits(admission_settings, threads)
+    shed_threads = admission_settings.get('shed_threads', 4) if admission_settings.get('enabled', True) else 0
+
+    return max_in_flight + max_queue + shed_threads
@@ -4,11 +4,23 @@
 # João Antunes <joao8tunes@gmail.com>
 # https://github.com/joao8tunes
 
+import argparse
+
 from source.system_settings import setup_logging
+from source.utils import report_import_time
 from source.app import app
+from source.health import warm_up
 
 setup_logging(__name__)
 
 
 if __name__ == '__main__':
-    app.run(threaded=True)
+    parser = argparse.ArgumentParser(description="Run the API service with the development server.")
+    parser.add_argument("--import-time", action="store_true", help="Print a startup import time report and exit.")
+    args = parser.parse_args()
+
+    if args.import_time:
+        report_import_time("wsgi")
+    else:
+        warm_up(app)
+        app.run(threaded=True)
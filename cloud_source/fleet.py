@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List
+import logging
+import json
+import time
+import yaml
+import os
+
+from cloud_source.system_settings import setup_logging, read_yaml
+from cloud_source.utils import write_if_changed
+from cloud_source.manifests import (
+    BUILD_CACHE_FILENAME, validate_app_settings, build_replacements, replace_placeholders, render_manifests,
+    load_build_cache, save_build_cache
+)
+from cloud_source.provisioning import build_provisioning_plan, render_provisioning_script
+from cloud_source.sizing import resolve_profile_filepath, load_sizing_profile, apply_sizing_profile
+
+setup_logging(__name__)
+
+# Cluster-level settings shared by every app of a fleet when not set in the app spec
+FLEET_DEFAULT_KEYS = ("project_id", "gke_cluster_name", "gke_cluster_region")
+
+
+def read_app_specs(filepath: str, defaults: dict = None) -> List[dict]:
+    """
+    Read a list of app specs from a YAML or JSONL file.
+
+    A YAML file holds either a list of specs or a mapping with an `apps` list and an optional `defaults` block.
+    A JSONL file holds one spec per line. Each spec has an `app_type` key plus the keys of the `cloud` block of
+    `settings.yaml`, and ServiceAPI specs also need a reserved `static_ip`.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the YAML or JSONL file.
+    defaults : dict
+        Default values applied to every spec, e.g. the `cloud` block of `settings.yaml`. Only cluster-level keys
+        are taken from it.
+
+    Returns
+    -------
+    List[dict]
+        App specs with defaults applied.
+    """
+    file_defaults = {key: value for key, value in (defaults or {}).items() if key in FLEET_DEFAULT_KEYS}
+
+    if filepath.endswith(".jsonl"):
+        with open(filepath, mode="rt", encoding="utf-8") as file:
+            specs = [json.loads(line) for line in file if line.strip()]
+    else:
+        content = read_yaml(filepath) or []
+
+        if isinstance(content, dict):
+            file_defaults.update(content.get('defaults') or {})
+            specs = content.get('apps') or []
+        else:
+            specs = content
+
+    return [{**file_defaults, **spec} for spec in specs]
+
+
+def apply_spec_sizing_profile(spec: dict) -> dict:
+    """
+    Apply the recommendations of the sizing profile of an app spec, if any, resolved against the project root as in
+    the interactive mode.
+
+    Parameters
+    ----------
+    spec : dict
+        App spec, without its `app_type`.
+
+    Returns
+    -------
+    dict
+        Updated copy of the app spec, without its `sizing_profile`.
+    """
+    spec = dict(spec)
+    profile_filepath = spec.pop('sizing_profile', None)
+    profile = load_sizing_profile(resolve_profile_filepath(profile_filepath)) if profile_filepath else None
+
+    return apply_sizing_profile(spec, profile) if profile else spec
+
+
+def validate_app_specs(specs: List[dict]) -> List[str]:
+    """
+    Validate every app spec of a fleet before anything is rendered, with the recommendations of its sizing profile
+    applied.
+
+    Parameters
+    ----------
+    specs : List[dict]
+        App specs.
+
+    Returns
+    -------
+    List[str]
+        Validation error messages prefixed by the spec position, empty if all specs are valid.
+    """
+    errors = []
+    app_names = set()
+
+    for index, spec in enumerate(specs):
+        spec = dict(spec)
+        app_type = spec.pop('app_type', "")
+        app_name = spec.get('app_name', "")
+        spec_errors = validate_app_settings(app_type, **apply_spec_sizing_profile(spec))
+
+        if app_type == "ServiceAPI" and not spec.get('static_ip'):
+            spec_errors.append("Missing reserved static IP address: static_ip")
+
+        if app_name in app_names:
+            spec_errors.append(f"Duplicated app name: '{app_name}'")
+
+        app_names.add(app_name)
+        errors.extend(f"[{index}] {app_name or '?'}: {error}" for error in spec_errors)
+
+    return errors
+
+
+def render_app(spec: dict, output_dir: str) -> dict:
+    """
+    Render every manifest of a single app spec into its own directory, skipping unchanged manifests.
+
+    Parameters
+    ----------
+    spec : dict
+        App spec.
+    output_dir : str
+        Fleet output directory. The app manifests are written to `<output_dir>/<app_name>`.
+
+    Returns
+    -------
+    dict
+        Application information.
+    """
+    spec = dict(spec)
+    app_type = spec.pop('app_type')
+    static_ip_address = spec.pop('static_ip', None)
+    spec = apply_spec_sizing_profile(spec)
+    errors = validate_app_settings(app_type, **spec)
+
+    # The sizing profile may have changed since the specs were validated
+    if errors:
+        raise ValueError(f"Invalid settings of app '{spec.get('app_name', '?')}': {'; '.join(errors)}")
+
+    replacements, app_info = build_replacements(app_type, **spec)
+    app_dir = Path(output_dir) / app_info['app_name']
+
+    if app_type == "ServiceAPI":
+        replacements['<VAR_STATIC_IP>'] = static_ip_address
+        app_info['ip_address'] = static_ip_address
+        app_info['endpoint_url'] = replace_placeholders(
+            "<VAR_APP_NAME>.endpoints.<VAR_PROJECT_ID>.cloud.goog", replacements
+        )
+
+    cache_filepath = app_dir / BUILD_CACHE_FILENAME
+    cache = load_build_cache(cache_filepath)
+    changed_manifests = render_manifests(
+        app_type, replacements, app_dir, cache=cache, pod_monitoring=app_info['pod_monitoring']
+    )
+
+    # The static IP of the app is reserved beforehand, as set in its spec
+    steps = build_provisioning_plan(app_type, replacements, include_static_ip=False)
+    script_file = app_dir / "apply_cloud_manifests.sh"
+
+    if write_if_changed(script_file, render_provisioning_script(steps)):
+        os.chmod(script_file, 0o755)
+
+    save_build_cache(cache_filepath, cache)
+    logging.debug(f"Rendered app '{app_info['app_name']}': {len(changed_manifests)} manifest(s) changed.")
+
+    app_info['output_dir'] = str(app_dir)
+
+    return app_info
+
+
+def build_fleet(specs: List[dict], output_dir: str, max_workers: int = None) -> List[dict]:
+    """
+    Validate and render the manifests of many apps in a process pool, without any cloud calls.
+
+    Parameters
+    ----------
+    specs : List[dict]
+        App specs.
+    output_dir : str
+        Fleet output directory, where each app gets its own subdirectory and a combined `app_info.yaml` index is
+        written.
+    max_workers : int
+        Maximum number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    List[dict]
+        Application information of every app, in spec order.
+
+    Raises
+    ------
+    ValueError
+        If any app spec is invalid. Nothing is rendered in this case.
+    """
+    logging.info(f"Building fleet of {len(specs)} app(s)...")
+
+    errors = validate_app_specs(specs)
+
+    if errors:
+        for error in errors:
+            logging.error(error)
+
+        raise ValueError(f"Invalid fleet specs: {len(errors)} error(s) found.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    apps_info = [None] * len(specs)
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(render_app, spec, output_dir): index for index, spec in enumerate(specs)}
+
+        for future in as_completed(futures):
+            apps_info[futures[future]] = future.result()
+
+    elapsed_time = time.perf_counter() - start_time
+    logging.info(
+        f"Rendered {len(specs)} app(s) in {elapsed_time:.2f} seconds "
+        f"({len(specs) / max(elapsed_time, 1e-9):.1f} apps/s)."
+    )
+
+    write_if_changed(
+        os.path.join(output_dir, "app_info.yaml"),
+        yaml.dump({'apps': apps_info}, default_flow_style=False, sort_keys=False)
+    )
+
+    return apps_info
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from pathlib import Path
+from typing import Dict, List
+import logging
+import time
+import uuid
+
+from cloud_source.system_settings import setup_logging
+from cloud_source.utils import execute_command
+from cloud_source.manifests import APP_TYPES, TEMPLATES_DIR, generate_config_file
+
+setup_logging(__name__)
+
+# Docker image settings used when the settings have no `docker` block
+DEFAULT_DOCKER_SETTINGS = {
+    'python_version': "3.12",
+    'user_id': 10001
+}
+
+
+def build_docker_replacements(docker_settings: dict = None) -> Dict[str, str]:
+    """
+    Build the placeholder replacements of the Docker files.
+
+    Parameters
+    ----------
+    docker_settings : dict
+        The `docker` block of `settings.yaml`.
+
+    Returns
+    -------
+    Dict[str, str]
+        Placeholder replacements.
+    """
+    docker_settings = {**DEFAULT_DOCKER_SETTINGS, **(docker_settings or {})}
+
+    return {
+        '<VAR_PYTHON_VERSION>': str(docker_settings['python_version']),
+        '<VAR_DOCKER_USER_ID>': str(docker_settings['user_id'])
+    }
+
+
+def render_docker_files(app_type: str, output_dir: Path, docker_settings: dict = None) -> List[Path]:
+    """
+    Render the `Dockerfile` and `.dockerignore` of an application type.
+
+    The Dockerfile installs the requirements before copying the source code, so source edits reuse the cached
+    dependency layer, in a build stage whose toolchain is left out of the slim runtime stage. The source code is
+    precompiled to bytecode and run by a non-root user.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    output_dir : Path
+        Root directory of the project.
+    docker_settings : dict
+        The `docker` block of `settings.yaml`.
+
+    Returns
+    -------
+    List[Path]
+        Paths of the files that changed.
+    """
+    if app_type not in APP_TYPES:
+        raise ValueError(f"Invalid app type: '{app_type}'")
+
+    replacements = build_docker_replacements(docker_settings)
+    docker_files = {
+        TEMPLATES_DIR / f"{app_type}_Dockerfile": output_dir / "Dockerfile",
+        TEMPLATES_DIR / "dockerignore": output_dir / ".dockerignore"
+    }
+    changed_files = []
+
+    for source, target in docker_files.items():
+        if generate_config_file(str(source), str(target), replacements):
+            changed_files.append(target)
+
+    return changed_files
+
+
+def get_image_size(tag: str) -> int:
+    """
+    Get the size of a local Docker image in bytes.
+
+    Parameters
+    ----------
+    tag : str
+        Image tag.
+
+    Returns
+    -------
+    int
+        Image size in bytes.
+    """
+    return int(execute_command(f"docker image inspect --format '{{{{.Size}}}}' {tag}", check=True).strip())
+
+
+def benchmark_docker_build(context_dir: Path, tag: str = "app-benchmark") -> dict:
+    """
+    Build the Docker image of a project locally and report the build times and the image size:
+
+    - cold: without the build cache, as on a fresh Cloud Build worker;
+    - source_edit: after a change of the source code, which must reuse the cached dependency layer;
+    - no_change: without changes, fully cached.
+
+    Parameters
+    ----------
+    context_dir : Path
+        Root directory of the project, with its `Dockerfile`.
+    tag : str
+        Tag of the built image.
+
+    Returns
+    -------
+    dict
+        Build times in seconds and image size in bytes.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If a build fails.
+    """
+    def build(options: str = "") -> float:
+        start_time = time.perf_counter()
+        execute_command(f"docker build {options} --tag {tag} {context_dir}", check=True)
+
+        return round(time.perf_counter() - start_time, 3)
+
+    logging.info(f"Benchmarking the Docker build of '{context_dir}'...")
+    results = {'cold_seconds': build("--no-cache")}
+
+    # A new file in the build context stands in for a source code edit
+    edit_filepath = Path(context_dir) / f".benchmark-{uuid.uuid4().hex}"
+
+    try:
+        edit_filepath.write_text("")
+        results['source_edit_seconds'] = build()
+    finally:
+        edit_filepath.unlink()
+
+    results['no_change_seconds'] = build()
+    results['image_bytes'] = get_image_size(tag)
+
+    logging.info(
+        f"Docker build: cold {results['cold_seconds']:.1f}s, source edit {results['source_edit_seconds']:.1f}s, "
+        f"no change {results['no_change_seconds']:.1f}s, image size {results['image_bytes'] / 1024 ** 2:.1f} MiB."
+    )
+
+    return results
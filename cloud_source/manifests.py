@@ -0,0 +1,608 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+import logging
+import json
+import re
+
+from cloud_source.system_settings import setup_logging
+from cloud_source.utils import validate_rfc1123_label, write_if_changed
+from cloud_source.templates import Template, load_template
+
+setup_logging(__name__)
+
+APP_TYPES = ("LocalApp", "ServiceAPI")
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "cloud_assets" / "cloud_templates"
+BUILD_CACHE_FILENAME = ".build_cache.json"
+HPA_METRIC_TYPES = ("cpu", "memory", "pods", "external")
+
+# Metric types of the autoscaling settings read from Google Cloud Managed Service for Prometheus, which need the
+# PodMonitoring of the app unless the `pod_monitoring` setting says otherwise
+POD_MONITORING_METRIC_TYPES = ("pods", "external")
+
+# Container resources used when the app settings have no `resources` block
+DEFAULT_RESOURCES = {
+    'requests': {'cpu': "500m", 'memory': "256Mi"},
+    'limits': {'cpu': "1000m", 'memory': "512Mi"}
+}
+
+# Lifetime of the image layers cached by kaniko in the registry when the app settings have no `build_cache_ttl`
+DEFAULT_BUILD_CACHE_TTL = "168h"
+
+# Rolling update used when the app settings have no `rollout` block: one extra pod at a time, none unavailable
+DEFAULT_ROLLOUT = {
+    'max_surge': 1,
+    'max_unavailable': 0,
+    'timeout': "600s"
+}
+
+# Autoscaling used when the app settings have no `autoscaling` block
+DEFAULT_AUTOSCALING = {
+    'min_replicas': 1,
+    'max_replicas': 3,
+    'metrics': [{'type': "cpu", 'target': 80}, {'type': "memory", 'target': 80}]
+}
+
+
+def replace_placeholders(text: str, replacements: dict) -> str:
+    """
+    Replace placeholders in the text with corresponding values from the replacements dictionary.
+
+    Parameters
+    ----------
+    text : str
+        The input text containing placeholders.
+    replacements : dict
+        Dictionary where keys are placeholders and values are their replacements.
+
+    Returns
+    -------
+    str
+        The text with placeholders replaced by actual values.
+    """
+    return Template(text).render(replacements)
+
+
+def generate_config_file(source_filepath: str, target_filepath: str, replacements: dict) -> bool:
+    """
+    Generate a configuration file by replacing placeholders in the source file with actual values.
+    The target file is only written if its content changes.
+
+    Parameters
+    ----------
+    source_filepath : str
+        Path to the source file with placeholders.
+    target_filepath : str
+        Path where the generated file will be saved.
+    replacements : dict
+        Dictionary of placeholders and their replacement values.
+
+    Returns
+    -------
+    bool
+        True if the target file was written.
+
+    Raises
+    ------
+    KeyError
+        If the source file contains a placeholder without a replacement value.
+    """
+    content = load_template(source_filepath).render(replacements, strict=True)
+
+    return write_if_changed(target_filepath, content)
+
+
+def load_build_cache(filepath: Path) -> dict:
+    """
+    Load the build cache, which maps generated files to the build keys they were rendered from.
+
+    Parameters
+    ----------
+    filepath : Path
+        Build cache filepath.
+
+    Returns
+    -------
+    dict
+        Build cache, empty if the file does not exist or is invalid.
+    """
+    try:
+        with open(filepath, mode="rt", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_cache(filepath: Path, cache: dict) -> bool:
+    """
+    Save the build cache if it changed.
+
+    Parameters
+    ----------
+    filepath : Path
+        Build cache filepath.
+    cache : dict
+        Build cache.
+
+    Returns
+    -------
+    bool
+        True if the file was written.
+    """
+    return write_if_changed(filepath, json.dumps(cache, indent=2, sort_keys=True) + "\n")
+
+
+def camel_case_keys(value):
+    """
+    Convert the keys of nested dictionaries from snake case to camel case, as used by Kubernetes manifests.
+
+    Parameters
+    ----------
+    value : Any
+        Dictionary, list or scalar value.
+
+    Returns
+    -------
+    Any
+        The value with converted keys.
+
+    Examples
+    --------
+    >>> camel_case_keys({'scale_down': {'stabilization_window_seconds': 300}})
+    {'scaleDown': {'stabilizationWindowSeconds': 300}}
+    """
+    if isinstance(value, dict):
+        return {re.sub(r'_([a-z])', lambda match: match.group(1).upper(), key): camel_case_keys(item)
+                for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [camel_case_keys(item) for item in value]
+
+    return value
+
+
+def validate_autoscaling(autoscaling: dict) -> List[str]:
+    """
+    Validate the autoscaling settings of an application.
+
+    Parameters
+    ----------
+    autoscaling : dict
+        The `autoscaling` block of the application settings.
+
+    Returns
+    -------
+    List[str]
+        Validation error messages, empty if the settings are valid.
+    """
+    errors = []
+    min_replicas = autoscaling.get('min_replicas', DEFAULT_AUTOSCALING['min_replicas'])
+    max_replicas = autoscaling.get('max_replicas', DEFAULT_AUTOSCALING['max_replicas'])
+
+    if not isinstance(min_replicas, int) or min_replicas < 1:
+        errors.append("Invalid autoscaling minimum replicas: min_replicas")
+    elif not isinstance(max_replicas, int) or max_replicas < min_replicas:
+        errors.append("Invalid autoscaling maximum replicas: max_replicas")
+
+    for index, metric in enumerate(autoscaling.get('metrics', DEFAULT_AUTOSCALING['metrics'])):
+        metric_type = metric.get('type')
+
+        if metric_type not in HPA_METRIC_TYPES:
+            errors.append(f"Invalid autoscaling metric type: metrics[{index}].type")
+        elif metric_type in ("pods", "external") and not metric.get('metric'):
+            errors.append(f"Missing autoscaling metric name: metrics[{index}].metric")
+
+        if not isinstance(metric.get('target'), (int, float)) or metric['target'] <= 0:
+            errors.append(f"Invalid autoscaling metric target: metrics[{index}].target")
+
+    return errors
+
+
+def validate_rollout(rollout: dict) -> List[str]:
+    """
+    Validate the rolling update settings of an application.
+
+    Parameters
+    ----------
+    rollout : dict
+        The `rollout` block of the application settings.
+
+    Returns
+    -------
+    List[str]
+        Validation error messages, empty if the settings are valid.
+    """
+    errors = []
+    rollout = {**DEFAULT_ROLLOUT, **rollout}
+
+    for key in ('max_surge', 'max_unavailable'):
+        value = rollout[key]
+
+        if not (isinstance(value, int) and value >= 0 or isinstance(value, str) and re.fullmatch(r'[0-9]+%', value)):
+            errors.append(f"Invalid rollout pod count or percentage: {key}")
+
+    if rollout['max_surge'] in (0, "0%") and rollout['max_unavailable'] in (0, "0%"):
+        errors.append("Invalid rollout, max_surge and max_unavailable cannot both be zero: max_surge")
+
+    if not re.fullmatch(r'[0-9]+[hms]', str(rollout['timeout'])):
+        errors.append("Invalid rollout timeout: timeout")
+
+    return errors
+
+
+def validate_resources(resources: dict) -> List[str]:
+    """
+    Validate the container resources of an application, as Kubernetes quantities (e.g. "500m" CPU, "256Mi" memory).
+
+    Parameters
+    ----------
+    resources : dict
+        The `resources` block of the application settings, with `requests` and `limits`.
+
+    Returns
+    -------
+    List[str]
+        Validation error messages, empty if the settings are valid.
+    """
+    errors = []
+    patterns = {'cpu': r'[0-9]+(\.[0-9]+)?m?', 'memory': r'[0-9]+(Ki|Mi|Gi|Ti|k|M|G|T)?'}
+
+    for kind in ('requests', 'limits'):
+        for resource, value in (resources.get(kind) or {}).items():
+            if resource not in patterns or not re.fullmatch(patterns[resource], str(value)):
+                errors.append(f"Invalid resource quantity: resources.{kind}.{resource}")
+
+    return errors
+
+
+def uses_pod_monitoring(**kwargs) -> bool:
+    """
+    Check whether the PodMonitoring of an application is rendered and applied, which needs the Managed Service for
+    Prometheus CRDs in the cluster: as set in `pod_monitoring`, or else if an autoscaling metric is a custom or
+    external metric.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Application settings, as in the `cloud` block of `settings.yaml`.
+
+    Returns
+    -------
+    bool
+        True if the PodMonitoring is used.
+
+    Examples
+    --------
+    >>> uses_pod_monitoring(autoscaling={'metrics': [{'type': "cpu", 'target': 80}]})
+    False
+    >>> uses_pod_monitoring(autoscaling={'metrics': [{'type': "pods", 'metric': "app_requests", 'target': 50}]})
+    True
+    >>> uses_pod_monitoring(pod_monitoring=True)
+    True
+    """
+    if kwargs.get('pod_monitoring') is not None:
+        return kwargs['pod_monitoring']
+
+    metrics = (kwargs.get('autoscaling') or {}).get('metrics', DEFAULT_AUTOSCALING['metrics'])
+
+    return any(metric.get('type') in POD_MONITORING_METRIC_TYPES for metric in metrics)
+
+
+def build_hpa_spec(autoscaling: dict) -> dict:
+    """
+    Build the replica bounds, metrics and scaling behavior of a HorizontalPodAutoscaler.
+
+    Metrics are either the average CPU or memory utilization of the pods (`cpu`, `memory`), the average of a custom
+    metric exported by the pods (`pods`, e.g. requests per second), or an external metric divided among the pods
+    (`external`, e.g. a Pub/Sub subscription backlog).
+
+    Parameters
+    ----------
+    autoscaling : dict
+        The `autoscaling` block of the application settings.
+
+    Returns
+    -------
+    dict
+        `minReplicas`, `maxReplicas`, `metrics` and `behavior` of the HPA spec.
+    """
+    metrics = []
+
+    for metric in autoscaling.get('metrics', DEFAULT_AUTOSCALING['metrics']):
+        metric_type = metric['type']
+
+        if metric_type in ("cpu", "memory"):
+            metrics.append({
+                'type': "Resource",
+                'resource': {
+                    'name': metric_type,
+                    'target': {'type': "Utilization", 'averageUtilization': int(metric['target'])}
+                }
+            })
+            continue
+
+        identifier = {'name': metric['metric']}
+
+        if metric.get('labels'):
+            identifier['selector'] = {'matchLabels': metric['labels']}
+
+        metrics.append({
+            'type': "Pods" if metric_type == "pods" else "External",
+            metric_type: {
+                'metric': identifier,
+                'target': {'type': "AverageValue", 'averageValue': str(metric['target'])}
+            }
+        })
+
+    return {
+        'minReplicas': autoscaling.get('min_replicas', DEFAULT_AUTOSCALING['min_replicas']),
+        'maxReplicas': autoscaling.get('max_replicas', DEFAULT_AUTOSCALING['max_replicas']),
+        'metrics': metrics,
+        'behavior': camel_case_keys(autoscaling.get('behavior') or {})
+    }
+
+
+def validate_app_settings(app_type: str, **kwargs) -> List[str]:
+    """
+    Validate the settings of a single application.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    kwargs : dict
+        Application settings, as in the `cloud` block of `settings.yaml`.
+
+    Returns
+    -------
+    List[str]
+        Validation error messages, empty if the settings are valid.
+    """
+    errors = []
+
+    if app_type not in APP_TYPES:
+        errors.append(f"Invalid app type: '{app_type}'")
+
+    for key in ('project_id', 'gke_cluster_name', 'gke_cluster_region', 'app_name'):
+        if not validate_rfc1123_label(str(kwargs.get(key, ""))):
+            errors.append(f"Invalid RFC 1123 label: {key}")
+
+    for key in ('gke_namespace', 'gke_service_account_name', 'iam_service_account_name'):
+        if key in kwargs and not validate_rfc1123_label(str(kwargs[key])):
+            errors.append(f"Invalid RFC 1123 label: {key}")
+
+    if not kwargs.get('repo_name'):
+        errors.append("Missing repository name: repo_name")
+
+    if not re.fullmatch(r'[0-9]+[hms]', str(kwargs.get('build_cache_ttl', DEFAULT_BUILD_CACHE_TTL))):
+        errors.append("Invalid build cache lifetime: build_cache_ttl")
+
+    if kwargs.get('pod_monitoring') is not None and not isinstance(kwargs['pod_monitoring'], bool):
+        errors.append("Invalid pod monitoring flag: pod_monitoring")
+
+    errors.extend(validate_autoscaling(kwargs.get('autoscaling') or {}))
+    errors.extend(validate_rollout(kwargs.get('rollout') or {}))
+    errors.extend(validate_resources(kwargs.get('resources') or {}))
+
+    return errors
+
+
+def build_replacements(app_type: str, **kwargs) -> Tuple[Dict[str, str], dict]:
+    """
+    Build the placeholder replacements and the application information of a single application.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    kwargs : dict
+        Application settings, as in the `cloud` block of `settings.yaml`.
+
+    Returns
+    -------
+    Tuple[Dict[str, str], dict]
+        Placeholder replacements and application information.
+    """
+    project_id = kwargs.get('project_id', "")
+    gke_cluster_name = kwargs.get('gke_cluster_name', "")
+    gke_cluster_region = kwargs.get('gke_cluster_region', "")
+    repo_name = kwargs.get('repo_name', "")
+    app_name = kwargs.get('app_name', "")
+    iam_service_account_name = kwargs.get('iam_service_account_name', app_name + "-iam-sa")
+    gke_service_account_name = kwargs.get('gke_service_account_name', app_name + "-gke-sa")
+    gke_namespace = kwargs.get('gke_namespace', "default")
+    app_title = kwargs.get('app_title', app_name)
+    app_description = kwargs.get('app_description', app_name)
+    app_version = kwargs.get('app_version', "1.0.0")
+    build_cache_ttl = kwargs.get('build_cache_ttl', DEFAULT_BUILD_CACHE_TTL)
+    deployment_name = app_name
+    hpa_name = app_name + "-hpa"
+    service_name = app_name + "-service"
+    certificate_name = app_name + "-certificate"
+    tls_name = app_name + "-tls"
+    ingress_name = app_name + "-ingress"
+    trigger_name = app_name + "-trigger"
+    ip_name = app_name + "-ip"
+    hpa_spec = build_hpa_spec(kwargs.get('autoscaling') or {})
+    rollout = {**DEFAULT_ROLLOUT, **(kwargs.get('rollout') or {})}
+    resources = kwargs.get('resources') or {}
+    requests = {**DEFAULT_RESOURCES['requests'], **(resources.get('requests') or {})}
+    limits = {**DEFAULT_RESOURCES['limits'], **(resources.get('limits') or {})}
+    pod_monitoring = uses_pod_monitoring(**kwargs)
+
+    replacements = {
+        '<VAR_PROJECT_ID>': project_id,
+        '<VAR_IAM_SERVICE_ACCOUNT_NAME>': iam_service_account_name,
+        '<VAR_GKE_CLUSTER_NAME>': gke_cluster_name,
+        '<VAR_GKE_CLUSTER_REGION>': gke_cluster_region,
+        '<VAR_GKE_SERVICE_ACCOUNT_NAME>': gke_service_account_name,
+        '<VAR_GKE_NAMESPACE>': gke_namespace,
+        '<VAR_REPO_NAME>': repo_name,
+        '<VAR_APP_NAME>': app_name,
+        '<VAR_APP_TITLE>': app_title,
+        '<VAR_APP_DESCRIPTION>': app_description,
+        '<VAR_APP_VERSION>': app_version,
+        '<VAR_DEPLOY_NAME>': app_name,
+        '<VAR_HPA_NAME>': hpa_name,
+        '<VAR_HPA_MIN_REPLICAS>': hpa_spec['minReplicas'],
+        '<VAR_HPA_MAX_REPLICAS>': hpa_spec['maxReplicas'],
+        # Rendered as JSON, which is valid YAML regardless of the indentation of the template
+        '<VAR_HPA_METRICS>': json.dumps(hpa_spec['metrics']),
+        '<VAR_HPA_BEHAVIOR>': json.dumps(hpa_spec['behavior']),
+        '<VAR_SERVICE_NAME>': service_name,
+        '<VAR_CERT_NAME>': certificate_name,
+        '<VAR_TLS_NAME>': tls_name,
+        '<VAR_INGRESS_NAME>': ingress_name,
+        '<VAR_TRIGGER_NAME>': trigger_name,
+        '<VAR_IP_NAME>': ip_name,
+        '<VAR_BUILD_CACHE_TTL>': build_cache_ttl,
+        '<VAR_ROLLOUT_MAX_SURGE>': json.dumps(rollout['max_surge']),
+        '<VAR_ROLLOUT_MAX_UNAVAILABLE>': json.dumps(rollout['max_unavailable']),
+        '<VAR_ROLLOUT_TIMEOUT>': rollout['timeout'],
+        '<VAR_CPU_REQUEST>': requests['cpu'],
+        '<VAR_MEMORY_REQUEST>': requests['memory'],
+        '<VAR_CPU_LIMIT>': limits['cpu'],
+        '<VAR_MEMORY_LIMIT>': limits['memory'],
+        '<VAR_POD_MONITORING>': json.dumps(pod_monitoring)
+    }
+
+    app_info = {
+        'app_type': app_type,
+        'project_id': project_id,
+        'gke_cluster_name': gke_cluster_name,
+        'gke_cluster_region': gke_cluster_region,
+        'repo_name': repo_name,
+        'app_name': app_name,
+        'iam_service_account_name': iam_service_account_name,
+        'gke_service_account_name': gke_service_account_name,
+        'gke_namespace': gke_namespace,
+        'app_title': app_title,
+        'app_description': app_description,
+        'app_version': app_version,
+        'deployment_name': deployment_name,
+        'hpa_name': hpa_name,
+        'min_replicas': hpa_spec['minReplicas'],
+        'max_replicas': hpa_spec['maxReplicas'],
+        'pod_monitoring': pod_monitoring,
+        'trigger_name': trigger_name
+    }
+
+    # Additional information for API template
+    if app_type == "ServiceAPI":
+        app_info['service_name'] = service_name
+        app_info['certificate_name'] = certificate_name
+        app_info['tls_name'] = tls_name
+        app_info['ingress_name'] = ingress_name
+        app_info['ip_name'] = ip_name
+
+    return replacements, app_info
+
+
+def get_config_files(app_type: str, output_dir: Path, pod_monitoring: bool = True) -> Dict[str, Dict[str, Path]]:
+    """
+    Map each manifest of an application type to its template and target paths.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    output_dir : Path
+        Directory where the manifests will be generated.
+    pod_monitoring : bool
+        Whether the PodMonitoring manifest is included (see `uses_pod_monitoring`).
+
+    Returns
+    -------
+    Dict[str, Dict[str, Path]]
+        Manifest names mapped to their 'source' and 'target' paths.
+    """
+    config_files = {
+        'cloudbuild.yaml': {
+            'source': TEMPLATES_DIR / f"{app_type}_cloudbuild.yaml",
+            'target': output_dir / "cloudbuild.yaml"
+        },
+        'deployment.yaml': {
+            'source': TEMPLATES_DIR / f"{app_type}_deployment.yaml",
+            'target': output_dir / "kubernetes" / "deployment.yaml"
+        },
+        'hpa.yaml': {
+            'source': TEMPLATES_DIR / f"{app_type}_hpa.yaml",
+            'target': output_dir / "kubernetes" / "hpa.yaml"
+        },
+    }
+
+    if pod_monitoring:
+        config_files['podmonitoring.yaml'] = {
+            'source': TEMPLATES_DIR / f"{app_type}_podmonitoring.yaml",
+            'target': output_dir / "kubernetes" / "podmonitoring.yaml"
+        }
+
+    # Additional files for API template
+    if app_type == "ServiceAPI":
+        for name in ('endpoint.yaml', 'certificate.yaml', 'service.yaml', 'ingress.yaml'):
+            config_files[name] = {
+                'source': TEMPLATES_DIR / f"ServiceAPI_{name}",
+                'target': output_dir / "kubernetes" / name
+            }
+
+    return config_files
+
+
+def render_manifests(
+        app_type: str, replacements: dict, output_dir: Path, cache: dict = None, pod_monitoring: bool = True
+) -> List[Path]:
+    """
+    Generate every manifest of an application into the output directory.
+
+    With a build cache, manifests whose template content and replacement values are unchanged are skipped without
+    being rendered, and manifests left over from a previous build (e.g. of another app type) are removed.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    replacements : dict
+        Dictionary of placeholders and their replacement values.
+    output_dir : Path
+        Directory where the manifests will be generated.
+    cache : dict
+        Build cache of the output directory, updated in place.
+    pod_monitoring : bool
+        Whether the PodMonitoring manifest is rendered (see `uses_pod_monitoring`).
+
+    Returns
+    -------
+    List[Path]
+        Paths of the manifests that changed.
+    """
+    manifests = cache.setdefault('manifests', {}) if cache is not None else {}
+    config_files = get_config_files(app_type, output_dir, pod_monitoring=pod_monitoring)
+    targets = {paths['target'].relative_to(output_dir).as_posix() for paths in config_files.values()}
+    changed = []
+
+    for target in sorted(set(manifests) - targets):
+        logging.debug(f"Removing stale manifest file '{target}'...")
+        (output_dir / target).unlink(missing_ok=True)
+        del manifests[target]
+
+    for config_name, paths in config_files.items():
+        target = paths['target'].relative_to(output_dir).as_posix()
+        build_key = load_template(paths['source']).build_key(replacements)
+
+        if manifests.get(target) == build_key and paths['target'].exists():
+            logging.debug(f"Manifest file '{config_name}' is up to date.")
+            continue
+
+        logging.debug(f"Generating '{config_name}' manifest file...")
+
+        if generate_config_file(paths['source'], paths['target'], replacements):
+            changed.append(paths['target'])
+
+        manifests[target] = build_key
+
+    return changed
@@ -0,0 +1,423 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, List
+import subprocess
+import logging
+import time
+
+from cloud_source.system_settings import setup_logging
+from cloud_source.utils import execute_command
+from cloud_source.templates import Template
+
+setup_logging(__name__)
+
+IAM_ROLES = (
+    "roles/cloudbuild.builds.editor",
+    "roles/container.clusterViewer",
+    "roles/container.developer",
+    "roles/deploymentmanager.editor",
+    "roles/editor",
+    "roles/iam.serviceAccountUser",
+    "roles/logging.logWriter",
+    "roles/source.reader",
+    "roles/storage.objectAdmin",
+    "roles/storage.objectViewer"
+)
+
+# Errors that mean the resource is already provisioned, so re-running a plan is safe
+ALREADY_EXISTS_ERRORS = ("already exists", "AlreadyExists")
+
+
+class Step:
+    """
+    Provisioning step: a shell command and the steps it depends on.
+
+    Parameters
+    ----------
+    name : str
+        Unique step name.
+    command : str
+        The shell command to be executed.
+    depends_on : Iterable[str]
+        Names of the steps that must succeed before this one runs.
+    retries : int
+        Number of retries on failure. Defaults to the plan setting.
+    allowed_errors : Iterable[str]
+        Error messages (stderr substrings) that are treated as success.
+    timeout : float
+        Maximum execution time of each attempt, in seconds. No limit by default.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            command: str,
+            depends_on: Iterable[str] = (),
+            retries: int = None,
+            allowed_errors: Iterable[str] = (),
+            timeout: float = None
+    ):
+        self.name = name
+        self.command = command
+        self.depends_on = tuple(depends_on)
+        self.retries = retries
+        self.allowed_errors = tuple(allowed_errors)
+        self.timeout = timeout
+        self.placeholders = frozenset()
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, depends_on={list(self.depends_on)!r})"
+
+
+class StepResult:
+    """
+    Outcome of a provisioning step.
+
+    Parameters
+    ----------
+    name : str
+        Step name.
+    status : str
+        One of 'succeeded', 'failed' or 'skipped' (a dependency did not succeed).
+    output : str
+        Output (stdout) of the last attempt.
+    attempts : int
+        Number of attempts.
+    started_at : float
+        Start time, in seconds since the plan started.
+    duration : float
+        Duration of all attempts, in seconds.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            status: str,
+            output: str = "",
+            attempts: int = 0,
+            started_at: float = 0.0,
+            duration: float = 0.0
+    ):
+        self.name = name
+        self.status = status
+        self.output = output
+        self.attempts = attempts
+        self.started_at = started_at
+        self.duration = duration
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == "succeeded"
+
+    def __repr__(self) -> str:
+        return f"StepResult({self.name!r}, {self.status!r}, attempts={self.attempts}, duration={self.duration:.2f})"
+
+
+def build_provisioning_plan(app_type: str, replacements: dict, include_static_ip: bool = True) -> List[Step]:
+    """
+    Build the provisioning steps of an application: IAM, Kubernetes and CI/CD resources, plus the static IP of
+    ServiceAPI applications.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of template to be used ('LocalApp' or 'ServiceAPI').
+    replacements : dict
+        Dictionary of placeholders and their replacement values.
+    include_static_ip : bool
+        Reserve and fetch the static IP of ServiceAPI applications. Disable it if the address is already reserved.
+
+    Returns
+    -------
+    List[Step]
+        Provisioning steps.
+    """
+    iam_member = "<VAR_IAM_SERVICE_ACCOUNT_NAME>@<VAR_PROJECT_ID>.iam.gserviceaccount.com"
+    binding_steps = [f"bind-role-{role.split('/')[-1]}" for role in IAM_ROLES]
+
+    steps = [
+        # IAM configuration
+        Step(
+            "create-iam-service-account",
+            "gcloud iam service-accounts create <VAR_IAM_SERVICE_ACCOUNT_NAME> "
+            "--display-name \"<VAR_IAM_SERVICE_ACCOUNT_NAME>\"",
+            allowed_errors=ALREADY_EXISTS_ERRORS
+        ),
+        Step(
+            "list-iam-service-account",
+            "gcloud iam service-accounts list --filter=\"displayName:<VAR_IAM_SERVICE_ACCOUNT_NAME>\"",
+            depends_on=["create-iam-service-account"]
+        ),
+        *[
+            Step(
+                step_name,
+                f"gcloud projects add-iam-policy-binding <VAR_PROJECT_ID> --member=\"serviceAccount:{iam_member}\" "
+                f"--role=\"{role}\" --condition=None",
+                depends_on=["create-iam-service-account"]
+            )
+            for step_name, role in zip(binding_steps, IAM_ROLES)
+        ],
+        # Kubernetes configuration
+        Step(
+            "create-namespace",
+            "kubectl create namespace <VAR_GKE_NAMESPACE>",
+            allowed_errors=ALREADY_EXISTS_ERRORS
+        ),
+        Step(
+            "create-gke-service-account",
+            "kubectl create serviceaccount <VAR_GKE_SERVICE_ACCOUNT_NAME> --namespace=<VAR_GKE_NAMESPACE>",
+            depends_on=["create-namespace"],
+            allowed_errors=ALREADY_EXISTS_ERRORS
+        ),
+        Step(
+            "describe-gke-service-account",
+            "kubectl get serviceaccount <VAR_GKE_SERVICE_ACCOUNT_NAME> --namespace=<VAR_GKE_NAMESPACE> -o yaml",
+            depends_on=["create-gke-service-account"]
+        ),
+        # CI/CD trigger setup
+        Step(
+            "create-trigger",
+            "gcloud beta builds triggers create cloud-source-repositories --name=\"<VAR_TRIGGER_NAME>\" "
+            "--repo=\"<VAR_REPO_NAME>\" --branch-pattern=\".*\" --build-config=\"cloudbuild.yaml\" "
+            f"--service-account=\"projects/<VAR_PROJECT_ID>/serviceAccounts/{iam_member}\" "
+            "--region=\"<VAR_GKE_CLUSTER_REGION>\"",
+            depends_on=binding_steps,
+            allowed_errors=ALREADY_EXISTS_ERRORS
+        ),
+    ]
+
+    if app_type == "ServiceAPI" and include_static_ip:
+        steps += [
+            Step(
+                "create-static-ip",
+                "gcloud compute addresses create <VAR_IP_NAME> --region=<VAR_GKE_CLUSTER_REGION>",
+                allowed_errors=ALREADY_EXISTS_ERRORS
+            ),
+            Step(
+                "fetch-static-ip",
+                "gcloud compute addresses describe <VAR_IP_NAME> --region=<VAR_GKE_CLUSTER_REGION> "
+                "--format=\"get(address)\"",
+                depends_on=["create-static-ip"]
+            ),
+        ]
+
+    for step in steps:
+        template = Template(step.command, name=step.name)
+        step.placeholders = template.placeholders
+        step.command = template.render(replacements)
+
+    return steps
+
+
+def render_provisioning_script(steps: List[Step]) -> str:
+    """
+    Render provisioning steps as a bash script that runs them one after another, for cloud resources provisioned
+    separately (e.g. by fleets). Steps fail on errors other than their allowed errors.
+
+    Parameters
+    ----------
+    steps : List[Step]
+        Provisioning steps, in an order that respects their dependencies (as built by `build_provisioning_plan`).
+
+    Returns
+    -------
+    str
+        Script content.
+    """
+    lines = ["#!/bin/bash"]
+
+    for step in steps:
+        lines += ["", f"echo \"Running step '{step.name}'...\""]
+
+        if step.allowed_errors:
+            pattern = "|".join(step.allowed_errors)
+            lines += [
+                f"if ! output=$({step.command} 2>&1); then",
+                f"    echo \"$output\" | grep -qE \"{pattern}\" || {{ echo \"$output\" >&2; exit 1; }}",
+                "fi",
+                "echo \"$output\""
+            ]
+        else:
+            lines.append(f"{step.command} || exit 1")
+
+    lines += ["", "echo \"Provisioning completed.\""]
+
+    return "\n".join(lines) + "\n"
+
+
+def validate_plan(steps: List[Step]) -> None:
+    """
+    Check that step names are unique, dependencies exist and there are no dependency cycles.
+
+    Parameters
+    ----------
+    steps : List[Step]
+        Provisioning steps.
+
+    Raises
+    ------
+    ValueError
+        If the steps do not form a valid DAG.
+    """
+    names = [step.name for step in steps]
+    duplicated = {name for name in names if names.count(name) > 1}
+
+    if duplicated:
+        raise ValueError(f"Duplicated step name(s): {', '.join(sorted(duplicated))}")
+
+    dependencies = {step.name: set(step.depends_on) for step in steps}
+
+    for name, depends_on in dependencies.items():
+        unknown = depends_on - dependencies.keys()
+
+        if unknown:
+            raise ValueError(f"Step '{name}' depends on unknown step(s): {', '.join(sorted(unknown))}")
+
+    # Kahn's algorithm: every step must be reachable in topological order
+    pending = {name: set(depends_on) for name, depends_on in dependencies.items()}
+
+    while pending:
+        ready = [name for name, depends_on in pending.items() if not depends_on]
+
+        if not ready:
+            raise ValueError(f"Dependency cycle between step(s): {', '.join(sorted(pending))}")
+
+        for name in ready:
+            del pending[name]
+
+        for depends_on in pending.values():
+            depends_on.difference_update(ready)
+
+
+def run_step(step: Step, retries: int, retry_delay: float, plan_start_time: float) -> StepResult:
+    """
+    Execute a provisioning step, retrying it with exponential backoff on failure.
+
+    Parameters
+    ----------
+    step : Step
+        Provisioning step.
+    retries : int
+        Number of retries, unless set by the step itself.
+    retry_delay : float
+        Delay before the first retry, in seconds. It doubles on each retry.
+    plan_start_time : float
+        Plan start time, as returned by `time.perf_counter`.
+
+    Returns
+    -------
+    StepResult
+        Step outcome.
+    """
+    retries = step.retries if step.retries is not None else retries
+    start_time = time.perf_counter()
+    result = StepResult(step.name, "failed", started_at=start_time - plan_start_time)
+
+    for attempt in range(retries + 1):
+        result.attempts = attempt + 1
+        logging.debug(f"Running step '{step.name}' (attempt {result.attempts})...")
+
+        try:
+            result.output = execute_command(
+                step.command, check=True, timeout=step.timeout, allowed_errors=step.allowed_errors
+            )
+            result.status = "succeeded"
+            break
+        except subprocess.SubprocessError as e:
+            if isinstance(e, subprocess.CalledProcessError) and any(
+                    error in (e.stderr or "") for error in step.allowed_errors
+            ):
+                logging.debug(f"Step '{step.name}' already provisioned.")
+                result.output = (e.output or "").strip()
+                result.status = "succeeded"
+                break
+
+            if attempt < retries:
+                time.sleep(retry_delay * 2 ** attempt)
+
+    result.duration = time.perf_counter() - start_time
+
+    return result
+
+
+def run_plan(
+        steps: List[Step],
+        max_parallel: int = 4,
+        retries: int = 0,
+        retry_delay: float = 2.0
+) -> Dict[str, StepResult]:
+    """
+    Run provisioning steps concurrently, respecting their dependencies.
+
+    A step starts as soon as all of its dependencies succeed. Steps whose dependencies fail are skipped, while
+    independent steps keep running. Commands are resolved through `PATH`, so stub `gcloud`/`kubectl` executables
+    can stand in for the real ones.
+
+    Parameters
+    ----------
+    steps : List[Step]
+        Provisioning steps.
+    max_parallel : int
+        Maximum number of steps running at the same time.
+    retries : int
+        Default number of retries of each step.
+    retry_delay : float
+        Delay before the first retry, in seconds.
+
+    Returns
+    -------
+    Dict[str, StepResult]
+        Step outcomes by step name, in completion order.
+
+    Raises
+    ------
+    ValueError
+        If the steps do not form a valid DAG.
+    """
+    validate_plan(steps)
+
+    pending = {step.name: step for step in steps}
+    results = {}
+    running = {}
+    plan_start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        while pending or running:
+            # Skip steps with a dependency that did not succeed
+            for name, step in list(pending.items()):
+                if any(dep in results and not results[dep].succeeded for dep in step.depends_on):
+                    logging.warning(f"Skipping step '{name}': a dependency did not succeed.")
+                    results[name] = StepResult(name, "skipped")
+                    del pending[name]
+
+            # Submit steps with all dependencies succeeded
+            for name, step in list(pending.items()):
+                if all(dep in results for dep in step.depends_on):
+                    running[executor.submit(run_step, step, retries, retry_delay, plan_start_time)] = name
+                    del pending[name]
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                result = future.result()
+                results[running.pop(future)] = result
+
+                if result.succeeded:
+                    logging.debug(f"Step '{result.name}' succeeded in {result.duration:.2f} seconds.")
+                else:
+                    logging.error(f"Step '{result.name}' failed after {result.attempts} attempt(s).")
+
+    logging.info(
+        f"Provisioning finished in {time.perf_counter() - plan_start_time:.2f} seconds: "
+        f"{sum(result.succeeded for result in results.values())}/{len(results)} step(s) succeeded."
+    )
+
+    return results
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Union
+import logging
+import filecmp
+import shutil
+import stat
+import os
+
+from cloud_source.system_settings import setup_logging
+
+setup_logging(__name__)
+
+# Names of the files and directories of the template trees that are never scaffolded
+IGNORED_NAMES = frozenset(("__pycache__", ".DS_Store"))
+IGNORED_SUFFIXES = (".pyc", ".pyo")
+
+
+def build_template_manifest(template_dir: Union[str, os.PathLike]) -> Dict[str, os.stat_result]:
+    """
+    Walk a template tree once with `os.scandir`, whose entries carry their file type, mapping the relative path of
+    each file to its stat result. Caches such as `__pycache__` are skipped.
+
+    Parameters
+    ----------
+    template_dir : Union[str, os.PathLike]
+        Root directory of the template tree.
+
+    Returns
+    -------
+    Dict[str, os.stat_result]
+        Relative POSIX paths of the files mapped to their stat results.
+
+    Examples
+    --------
+    >>> build_template_manifest('cloud_assets/source_templates/LocalApp')
+    {'run.py': os.stat_result(...), 'source/app.py': os.stat_result(...), ...}
+    """
+    manifest = {}
+    pending = [("", os.fspath(template_dir))]
+
+    while pending:
+        prefix, directory = pending.pop()
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name in IGNORED_NAMES or entry.name.endswith(IGNORED_SUFFIXES):
+                    continue
+
+                relative_path = prefix + entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append((relative_path + "/", entry.path))
+                elif entry.is_file():
+                    manifest[relative_path] = entry.stat()
+
+    return manifest
+
+
+def sync_file(source: str, target: str, source_stat: os.stat_result) -> str:
+    """
+    Make a target file identical to a source file in content and mode, touching it only if it differs.
+
+    Files of different sizes are copied right away, and files of the same size are compared byte by byte, which
+    only reads them. Copies use `shutil.copyfile`, which relies on the zero-copy `os.sendfile` on Linux, into a
+    temporary file renamed over the target, so an interrupted copy never leaves a truncated file.
+
+    Parameters
+    ----------
+    source : str
+        Source filepath.
+    target : str
+        Target filepath.
+    source_stat : os.stat_result
+        Stat result of the source file.
+
+    Returns
+    -------
+    str
+        "copied", "mode" if only the mode was updated, or "unchanged".
+    """
+    try:
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        target_stat = None
+
+    if (
+        target_stat is not None and stat.S_ISREG(target_stat.st_mode) and target_stat.st_size == source_stat.st_size
+        and filecmp.cmp(source, target, shallow=False)
+    ):
+        if stat.S_IMODE(target_stat.st_mode) == stat.S_IMODE(source_stat.st_mode):
+            return "unchanged"
+
+        os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+
+        return "mode"
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_target = f"{target}.{os.getpid()}.tmp"
+
+    try:
+        shutil.copyfile(source, temp_target)
+        os.chmod(temp_target, stat.S_IMODE(source_stat.st_mode))
+        os.replace(temp_target, target)
+    except BaseException:
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+        raise
+
+    return "copied"
+
+
+def scaffold_project(
+        template_dir: Union[str, os.PathLike],
+        target_dir: Union[str, os.PathLike],
+        stale_template_dirs: Iterable[Union[str, os.PathLike]] = (),
+        max_workers: int = None
+) -> Dict[str, int]:
+    """
+    Scaffold a project from a template tree: copy the template files whose content or mode differs from the target
+    ones in a thread pool, and remove the target files that only belong to other templates (e.g. of the previously
+    scaffolded app type). Files that are already up to date are not touched, so their mtimes are kept.
+
+    Hardlinks and reflinks are not used, so editing the scaffolded files never changes the templates.
+
+    Parameters
+    ----------
+    template_dir : Union[str, os.PathLike]
+        Root directory of the template tree.
+    target_dir : Union[str, os.PathLike]
+        Root directory of the project.
+    stale_template_dirs : Iterable[Union[str, os.PathLike]]
+        Root directories of other template trees, whose files are removed from the project unless they are also in
+        the scaffolded template.
+    max_workers : int
+        Number of copy threads. Defaults to the `ThreadPoolExecutor` default.
+
+    Returns
+    -------
+    Dict[str, int]
+        Number of files per outcome: "copied", "mode", "unchanged", "removed" and "failed".
+    """
+    target_dir = Path(target_dir)
+    manifest = build_template_manifest(template_dir)
+    counts = {'copied': 0, 'mode': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+
+    stale_files = set()
+
+    for stale_template_dir in stale_template_dirs:
+        stale_files.update(build_template_manifest(stale_template_dir))
+
+    for relative_path in sorted(stale_files - manifest.keys()):
+        filepath = target_dir / relative_path
+
+        try:
+            filepath.unlink()
+            counts['removed'] += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"An error occurred while deleting file {filepath}: {e}")
+            counts['failed'] += 1
+
+    def sync(relative_path: str) -> str:
+        source = os.path.join(template_dir, relative_path)
+        target = os.path.join(target_dir, relative_path)
+
+        try:
+            return sync_file(source, target, manifest[relative_path])
+        except OSError as e:
+            logging.error(f"An error occurred while copying file {source} to {target}: {e}")
+            return "failed"
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for outcome in executor.map(sync, manifest):
+            counts[outcome] += 1
+
+    logging.debug(
+        f"Scaffolded {len(manifest)} file(s): {counts['copied']} copied, {counts['mode']} mode updated, "
+        f"{counts['unchanged']} unchanged, {counts['removed']} stale removed, {counts['failed']} failed."
+    )
+
+    return counts
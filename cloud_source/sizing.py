@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import subprocess
+import threading
+import tempfile
+import logging
+import signal
+import socket
+import math
+import time
+import json
+import sys
+import os
+
+import yaml
+
+from cloud_source.system_settings import setup_logging
+from cloud_source.manifests import DEFAULT_AUTOSCALING
+
+setup_logging(__name__)
+
+PROFILE_FILENAME = "sizing_profile.yaml"
+
+# Root of the project, which relative sizing profile paths of the settings and app specs are resolved against
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+MEBIBYTE = 1024 ** 2
+
+# Memory growth under load, as a fraction of the peak, below which memory is not an autoscaling signal
+MIN_MEMORY_GROWTH = 0.2
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Compute a percentile of sorted values with the nearest-rank method, like the benchmark of the *ServiceAPI*.
+
+    Parameters
+    ----------
+    sorted_values : List[float]
+        Values in ascending order.
+    fraction : float
+        Percentile as a fraction, e.g. 0.95.
+
+    Returns
+    -------
+    float
+        The percentile value, or 0.0 if there are no values.
+
+    Examples
+    --------
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+    2.0
+    >>> percentile(list(range(1, 101)), 0.95)
+    95
+    """
+    if not sorted_values:
+        return 0.0
+
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+
+    return sorted_values[index]
+
+
+def get_process_tree_usage(pid: int) -> Tuple[float, int]:
+    """
+    Get the CPU time and resident memory of a process and its children, e.g. the gunicorn master and workers, from
+    `/proc`.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID.
+
+    Returns
+    -------
+    Tuple[float, int]
+        CPU time in seconds and resident memory in bytes, or zeros if they are not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", mode="rt") as file:
+            # Fields after the command name, which can contain spaces: utime and stime are the 14th and 15th fields
+            fields = file.read().rsplit(")", 1)[1].split()
+            cpu_time = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+        with open(f"/proc/{pid}/statm", mode="rt") as file:
+            memory = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+        with open(f"/proc/{pid}/task/{pid}/children", mode="rt") as file:
+            children = [int(child) for child in file.read().split()]
+    except (OSError, ValueError, IndexError):
+        return 0.0, 0
+
+    for child in children:
+        child_cpu_time, child_memory = get_process_tree_usage(child)
+        cpu_time += child_cpu_time
+        memory += child_memory
+
+    return cpu_time, memory
+
+
+class ResourceSampler:
+    """
+    Background sampler of the CPU usage (in cores) and resident memory of a process tree over time.
+
+    CPU usage is the CPU time consumed between two samples divided by the time between them, so exited children
+    (e.g. restarted workers) only count while they were alive.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID of the root of the process tree.
+    interval : float
+        Seconds between samples.
+
+    Examples
+    --------
+    >>> sampler = ResourceSampler(process.pid)
+    >>> sampler.start()
+    >>> samples = sampler.stop()  # doctest: +SKIP
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_samples: List[float] = []
+        self.memory_samples: List[int] = []
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        """
+        Start sampling.
+        """
+        self._thread.start()
+
+    def stop(self) -> Tuple[List[float], List[int]]:
+        """
+        Stop sampling.
+
+        Returns
+        -------
+        Tuple[List[float], List[int]]
+            CPU usage samples in cores and resident memory samples in bytes.
+        """
+        self._done.set()
+        self._thread.join()
+
+        return self.cpu_samples, self.memory_samples
+
+    def _run(self) -> None:
+        last_cpu_time, memory = get_process_tree_usage(self.pid)
+        last_time = time.monotonic()
+        self.memory_samples.append(memory)
+
+        while not self._done.wait(self.interval):
+            cpu_time, memory = get_process_tree_usage(self.pid)
+            now = time.monotonic()
+
+            if memory:
+                self.cpu_samples.append(max(0.0, cpu_time - last_cpu_time) / (now - last_time))
+                self.memory_samples.append(memory)
+
+            last_cpu_time, last_time = cpu_time, now
+
+
+def summarize_usage(cpu_samples: List[float], memory_samples: List[int]) -> dict:
+    """
+    Summarize CPU and memory samples.
+
+    Parameters
+    ----------
+    cpu_samples : List[float]
+        CPU usage samples in cores.
+    memory_samples : List[int]
+        Resident memory samples in bytes, the first one taken before the load.
+
+    Returns
+    -------
+    dict
+        CPU percentiles in cores, and idle memory and memory percentiles in bytes.
+    """
+    cpu = sorted(cpu_samples)
+    memory = sorted(memory_samples)
+
+    return {
+        'samples': len(cpu_samples),
+        'cpu_cores': {
+            'p50': round(percentile(cpu, 0.50), 3),
+            'p95': round(percentile(cpu, 0.95), 3),
+            'max': round(cpu[-1], 3) if cpu else 0.0
+        },
+        'memory_bytes': {
+            'idle': memory_samples[0] if memory_samples else 0,
+            'p50': int(percentile(memory, 0.50)),
+            'p95': int(percentile(memory, 0.95)),
+            'max': memory[-1] if memory else 0
+        }
+    }
+
+
+def _round_up(value: float, step: int) -> int:
+    return int(math.ceil(value / step)) * step
+
+
+def recommend_resources(usage: dict, headroom: float = 0.25, memory_limit_headroom: float = 0.5) -> dict:
+    """
+    Recommend the resource requests and limits and the HPA utilization targets of a pod from its usage under load.
+
+    - CPU request: the p95 usage plus headroom, so the pod is scheduled with the CPU it needs under the load;
+      CPU limit: twice the request or the peak usage plus headroom, whichever is higher, to absorb bursts without
+      throttling.
+    - Memory request: the p95 usage plus headroom; memory limit: the peak usage plus `memory_limit_headroom`, to
+      avoid OOMKills.
+    - HPA targets: the utilization of the requests at the measured load, so pods are added before they exceed it.
+      Memory is not a target when it barely grows under load, as adding pods would not reduce it.
+
+    Parameters
+    ----------
+    usage : dict
+        Usage summary, as returned by `summarize_usage`.
+    headroom : float
+        Fraction added to the p95 usage in the requests.
+    memory_limit_headroom : float
+        Fraction added to the peak memory usage in the limit.
+
+    Returns
+    -------
+    dict
+        `resources` (requests and limits, as Kubernetes quantities) and `autoscaling_targets` (utilization percents).
+
+    Raises
+    ------
+    ValueError
+        If there are no CPU samples or no memory usage, as the recommendations would be the minimums.
+
+    Examples
+    --------
+    >>> memory = {'idle': 90 * MEBIBYTE, 'p50': 100 * MEBIBYTE, 'p95': 110 * MEBIBYTE, 'max': 120 * MEBIBYTE}
+    >>> usage = {'cpu_cores': {'p50': 0.2, 'p95': 0.3, 'max': 0.5}, 'memory_bytes': memory}
+    >>> recommend_resources(usage)['resources']
+    {'requests': {'cpu': '400m', 'memory': '144Mi'}, 'limits': {'cpu': '800m', 'memory': '192Mi'}}
+    >>> recommend_resources(summarize_usage([], [0]))
+    Traceback (most recent call last):
+    ...
+    ValueError: No CPU samples were taken, the app did not run long enough to be profiled.
+    """
+    cpu = usage['cpu_cores']
+    memory = usage['memory_bytes']
+
+    if not usage.get('samples', 1):
+        raise ValueError("No CPU samples were taken, the app did not run long enough to be profiled.")
+
+    if not memory['max']:
+        raise ValueError("No memory usage was measured, the app did not run while it was profiled.")
+
+    cpu_request = max(100, _round_up(cpu['p95'] * (1 + headroom) * 1000, 50))
+    cpu_limit = max(2 * cpu_request, _round_up(cpu['max'] * (1 + headroom) * 1000, 100))
+    memory_request = max(64, _round_up(memory['p95'] * (1 + headroom) / MEBIBYTE, 16))
+    memory_limit = max(memory_request, _round_up(memory['max'] * (1 + memory_limit_headroom) / MEBIBYTE, 16))
+
+    memory_growth = (memory['max'] - memory['idle']) / memory['max'] if memory['max'] else 0.0
+    memory_target = None
+
+    if memory_growth >= MIN_MEMORY_GROWTH:
+        memory_target = min(90, max(50, round(100 * memory['p95'] / (memory_request * MEBIBYTE))))
+
+    return {
+        'resources': {
+            'requests': {'cpu': f"{cpu_request}m", 'memory': f"{memory_request}Mi"},
+            'limits': {'cpu': f"{cpu_limit}m", 'memory': f"{memory_limit}Mi"}
+        },
+        'autoscaling_targets': {
+            'cpu': min(90, max(50, round(100 / (1 + headroom)))),
+            'memory': memory_target
+        }
+    }
+
+
+def _get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1.0):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise TimeoutError(f"Server not reachable at port {port} after {timeout} seconds.")
+
+
+def _run_service_load(project_dir: Path, duration: float, concurrency: int, warmup: float) -> Tuple[dict, dict]:
+    port = _get_free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"],
+        cwd=project_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        _wait_for_port(port)
+        sampler = ResourceSampler(server.pid)
+        sampler.start()
+
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                output_filepath = os.path.join(temp_dir, "benchmark.json")
+
+                # The load generator of the benchmark runs in its own process, so it is not sampled
+                subprocess.run(
+                    [
+                        sys.executable, "benchmark.py", "--url", f"http://127.0.0.1:{port}",
+                        "--duration", str(duration), "--concurrency", str(concurrency), "--warmup", str(warmup),
+                        "--output", output_filepath
+                    ],
+                    cwd=project_dir, check=True, stdout=subprocess.DEVNULL
+                )
+
+                with open(output_filepath, mode="rt") as file:
+                    overall = json.load(file)['overall']
+        finally:
+            cpu_samples, memory_samples = sampler.stop()
+
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with code {server.returncode} while it was profiled.")
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    if overall['errors']:
+        raise RuntimeError(f"The benchmark reported {overall['errors']} failed request(s), the app was not profiled.")
+
+    # Samples of the warm-up, taken while the load ramps up, are dropped; the first memory sample is the idle one
+    skipped = int(warmup / sampler.interval)
+    load = {key: overall[key] for key in ('requests', 'rps', 'p95_ms', 'errors')}
+
+    return summarize_usage(cpu_samples[skipped:], memory_samples[:1] + memory_samples[1 + skipped:]), load
+
+
+def _run_local_app(project_dir: Path, duration: float) -> Tuple[dict, dict]:
+    process = subprocess.Popen(
+        [sys.executable, "run.py"], cwd=project_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sampler = ResourceSampler(process.pid)
+    sampler.start()
+
+    try:
+        time.sleep(duration)
+        exit_code = process.poll()
+    finally:
+        cpu_samples, memory_samples = sampler.stop()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    if exit_code is not None:
+        raise RuntimeError(f"The app exited with code {exit_code} before the end of the profiling.")
+
+    return summarize_usage(cpu_samples, memory_samples), {}
+
+
+def profile_app(
+        app_type: str,
+        project_dir: Path,
+        duration: float = 60.0,
+        concurrency: int = 16,
+        warmup: float = 5.0,
+        headroom: float = 0.25
+) -> dict:
+    """
+    Run a generated app locally, sample its CPU and memory usage over time, and recommend its resources.
+
+    The *ServiceAPI* is served by gunicorn and driven by its `benchmark.py` load generator, and the *LocalApp* runs
+    its `run.py` workload. Run it with the `server` settings of the pod (e.g. a fixed number of workers), as the
+    layout derived from the CPUs of the local machine can differ from the one of the container.
+
+    Parameters
+    ----------
+    app_type : str
+        The type of the app ('LocalApp' or 'ServiceAPI').
+    project_dir : Path
+        Root directory of the generated app.
+    duration : float
+        Measurement duration, in seconds.
+    concurrency : int
+        Number of concurrent clients of the *ServiceAPI* load.
+    warmup : float
+        Warm-up duration of the *ServiceAPI* load, not sampled, in seconds.
+    headroom : float
+        Fraction added to the p95 usage in the requests.
+
+    Returns
+    -------
+    dict
+        Sizing profile: measured usage and load, recommended resources and autoscaling targets.
+
+    Raises
+    ------
+    RuntimeError
+        If the app exited before the end of the profiling or the benchmark reported failed requests.
+    ValueError
+        If no usage was sampled.
+    """
+    if sys.platform != "linux":
+        raise OSError("Resource sampling reads '/proc' and is only supported on Linux.")
+
+    logging.info(f"Profiling the {app_type} in '{project_dir}' for {duration} seconds...")
+
+    if app_type == "ServiceAPI":
+        usage, load = _run_service_load(Path(project_dir), duration, concurrency, warmup)
+        load['concurrency'] = concurrency
+    elif app_type == "LocalApp":
+        usage, load = _run_local_app(Path(project_dir), duration)
+    else:
+        raise ValueError(f"Invalid app type: '{app_type}'")
+
+    profile = {
+        'app_type': app_type,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'duration': duration,
+        'load': load,
+        'usage': usage,
+        **recommend_resources(usage, headroom=headroom)
+    }
+
+    resources = profile['resources']
+    logging.info(
+        f"Recommended resources: requests {resources['requests']['cpu']}/{resources['requests']['memory']}, "
+        f"limits {resources['limits']['cpu']}/{resources['limits']['memory']}, "
+        f"autoscaling targets {profile['autoscaling_targets']}."
+    )
+
+    return profile
+
+
+def write_sizing_profile(filepath: Path, profile: dict) -> None:
+    """
+    Write a sizing profile as YAML.
+
+    Parameters
+    ----------
+    filepath : Path
+        Profile filepath.
+    profile : dict
+        Sizing profile, as returned by `profile_app`.
+    """
+    with open(filepath, mode="wt", encoding="utf-8") as file:
+        yaml.safe_dump(profile, file, default_flow_style=False, sort_keys=False)
+
+
+def resolve_profile_filepath(filepath: Union[str, os.PathLike] = PROFILE_FILENAME) -> Path:
+    """
+    Resolve the filepath of a sizing profile against the project root, regardless of the working directory.
+
+    Parameters
+    ----------
+    filepath : Union[str, os.PathLike]
+        Profile filepath, relative to the project root or absolute.
+
+    Returns
+    -------
+    Path
+        Absolute profile filepath.
+
+    Examples
+    --------
+    >>> resolve_profile_filepath("sizing_profile.yaml") == PROJECT_DIR / "sizing_profile.yaml"
+    True
+    >>> resolve_profile_filepath("/tmp/profile.yaml")
+    PosixPath('/tmp/profile.yaml')
+    """
+    return PROJECT_DIR / filepath
+
+
+def load_sizing_profile(filepath: Path) -> Optional[dict]:
+    """
+    Load a sizing profile.
+
+    Parameters
+    ----------
+    filepath : Path
+        Profile filepath.
+
+    Returns
+    -------
+    Optional[dict]
+        Sizing profile, or None if the file does not exist.
+    """
+    try:
+        with open(filepath, mode="rt", encoding="utf-8") as file:
+            return yaml.safe_load(file) or {}
+    except FileNotFoundError:
+        return None
+
+
+def apply_sizing_profile(app_settings: dict, profile: dict) -> dict:
+    """
+    Apply the recommendations of a sizing profile to the settings of an application: the profile resources replace
+    the `resources` block, and its targets replace the targets of the `cpu` and `memory` autoscaling metrics. The
+    `memory` metric is removed if the profile has no memory target.
+
+    Parameters
+    ----------
+    app_settings : dict
+        Application settings, as in the `cloud` block of `settings.yaml`.
+    profile : dict
+        Sizing profile.
+
+    Returns
+    -------
+    dict
+        Updated copy of the application settings.
+    """
+    app_settings = dict(app_settings)
+
+    if profile.get('resources'):
+        app_settings['resources'] = profile['resources']
+
+    targets = profile.get('autoscaling_targets') or {}
+
+    if targets:
+        autoscaling = dict(app_settings.get('autoscaling') or {})
+        metrics = []
+
+        for metric in autoscaling.get('metrics', DEFAULT_AUTOSCALING['metrics']):
+            if metric.get('type') in targets:
+                if targets[metric['type']] is None:
+                    continue
+
+                metric = {**metric, 'target': targets[metric['type']]}
+
+            metrics.append(metric)
+
+        autoscaling['metrics'] = metrics
+        app_settings['autoscaling'] = autoscaling
+
+    return app_settings
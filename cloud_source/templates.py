@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# João Antunes <joao8tunes@gmail.com>
+# https://github.com/joao8tunes
+
+from functools import lru_cache
+from typing import Iterable, List, Set, Tuple, Union
+import hashlib
+import logging
+import json
+import re
+import os
+
+from cloud_source.system_settings import setup_logging
+
+setup_logging(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r'<VAR_[A-Z0-9_]+>')
+
+
+class Template:
+    """
+    Template compiled into a list of literal and placeholder segments.
+
+    The text is parsed once, so rendering is a single linear pass over the segments regardless of how many
+    replacements are given.
+
+    Parameters
+    ----------
+    text : str
+        Template text containing `<VAR_*>` placeholders.
+    name : str
+        Template name used in log messages.
+
+    Examples
+    --------
+    >>> template = Template("name: <VAR_APP_NAME>")
+    >>> template.placeholders
+    frozenset({'<VAR_APP_NAME>'})
+    >>> template.render({'<VAR_APP_NAME>': "my-app"})
+    'name: my-app'
+    """
+
+    def __init__(self, text: str, name: str = "<string>"):
+        self.name = name
+        self.digest = hashlib.sha256(text.encode()).hexdigest()
+        self.segments = self._compile(text)
+        self.placeholders = frozenset(segment for is_placeholder, segment in self.segments if is_placeholder)
+
+    @staticmethod
+    def _compile(text: str) -> List[Tuple[bool, str]]:
+        """
+        Split the text into `(is_placeholder, segment)` pairs.
+
+        Parameters
+        ----------
+        text : str
+            Template text.
+
+        Returns
+        -------
+        List[Tuple[bool, str]]
+            Ordered literal and placeholder segments.
+        """
+        segments = []
+        position = 0
+
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > position:
+                segments.append((False, text[position:match.start()]))
+
+            segments.append((True, match.group()))
+            position = match.end()
+
+        if position < len(text):
+            segments.append((False, text[position:]))
+
+        return segments
+
+    def check(self, replacements: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        """
+        Compare the template placeholders against the available replacement keys.
+
+        Parameters
+        ----------
+        replacements : Iterable[str]
+            Available placeholder keys.
+
+        Returns
+        -------
+        Tuple[Set[str], Set[str]]
+            Placeholders missing from the replacements, and replacements not used by the template.
+        """
+        keys = set(replacements)
+
+        return set(self.placeholders - keys), keys - self.placeholders
+
+    def build_key(self, replacements: dict) -> str:
+        """
+        Hash the template content together with the replacement values it uses.
+
+        Two renders with the same key produce the same output, so the key can be used to skip unchanged targets.
+
+        Parameters
+        ----------
+        replacements : dict
+            Dictionary where keys are placeholders and values are their replacements.
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 digest.
+        """
+        used = {placeholder: str(replacements.get(placeholder)) for placeholder in sorted(self.placeholders)}
+        content = json.dumps([self.digest, used], sort_keys=True)
+
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def render(self, replacements: dict, strict: bool = False) -> str:
+        """
+        Render the template with the given replacements.
+
+        Parameters
+        ----------
+        replacements : dict
+            Dictionary where keys are placeholders and values are their replacements.
+        strict : bool
+            Raise an error if a placeholder has no replacement, instead of logging it.
+
+        Returns
+        -------
+        str
+            The rendered text.
+
+        Raises
+        ------
+        KeyError
+            If `strict` is set and a placeholder has no replacement.
+        """
+        missing, _ = self.check(replacements)
+
+        if missing:
+            message = f"Unresolved placeholder(s) in '{self.name}': {', '.join(sorted(missing))}"
+
+            if strict:
+                raise KeyError(message)
+
+            logging.error(message)
+
+        return "".join(
+            str(replacements.get(segment, segment)) if is_placeholder else segment
+            for is_placeholder, segment in self.segments
+        )
+
+
+def find_unused_replacements(placeholder_sets: Iterable[Iterable[str]], replacements: Iterable[str]) -> Set[str]:
+    """
+    Find the replacements not used by any of the rendered templates.
+
+    A single replacement dictionary is shared by every template of a build, so unused keys are only meaningful
+    against the union of their placeholders.
+
+    Parameters
+    ----------
+    placeholder_sets : Iterable[Iterable[str]]
+        Placeholders of each rendered template.
+    replacements : Iterable[str]
+        Available placeholder keys.
+
+    Returns
+    -------
+    Set[str]
+        Replacement keys that no template uses.
+
+    Examples
+    --------
+    >>> find_unused_replacements([{'<VAR_A>'}, {'<VAR_B>'}], ['<VAR_A>', '<VAR_B>', '<VAR_C>'])
+    {'<VAR_C>'}
+    """
+    return set(replacements).difference(*placeholder_sets)
+
+
+@lru_cache(maxsize=None)
+def _load_template(filepath: str, mtime_ns: int) -> Template:
+    """
+    Read and compile a template file, cached by path and modification time.
+    """
+    with open(filepath, mode="r") as file:
+        return Template(file.read(), name=os.path.basename(filepath))
+
+
+def load_template(filepath: Union[str, os.PathLike]) -> Template:
+    """
+    Load a compiled template, parsing the file only once while it is unchanged.
+
+    Parameters
+    ----------
+    filepath : Union[str, os.PathLike]
+        Path to the template file.
+
+    Returns
+    -------
+    Template
+        The compiled template.
+    """
+    filepath = os.fspath(filepath)
+
+    return _load_template(filepath, os.stat(filepath).st_mtime_ns)
@@ -4,12 +4,15 @@
 # João Antunes <joao8tunes@gmail.com>
 # https://github.com/joao8tunes
 
-from pathlib import Path
-from typing import List
+from collections import deque
+from typing import AsyncIterator, Iterable, List, Union
 import subprocess
-import tempfile
+import asyncio
 import logging
+import signal
+import time
 import re
+import os
 
 
 from cloud_source.system_settings import setup_logging
@@ -51,54 +54,216 @@ def validate_rfc1123_label(label: str) -> bool:
     return re.match(rfc1123_label_pattern, label) is not None
 
 
-def list_files(directory: str) -> List[str]:
+class CommandResult:
     """
-    Recursively list all files in a directory and its subdirectories.
+    Outcome of a shell command.
 
     Parameters
     ----------
-    directory : str
-        The path of the root directory to search for files.
+    command : str
+        The executed shell command.
+    return_code : int
+        Exit code of the command.
+    duration : float
+        Execution time, in seconds.
+    stdout : str
+        Output (stdout) of the command, empty if it was not captured.
+    tail : List[str]
+        Last lines of the combined stdout and stderr output.
+    stderr_tail : List[str]
+        Last lines of the stderr output.
+    timed_out : bool
+        Whether the command was killed after its timeout expired.
+    """
 
-    Returns
-    -------
-    List[str]
-        A list of file paths as strings.
+    def __init__(
+            self,
+            command: str,
+            return_code: int,
+            duration: float,
+            stdout: str = "",
+            tail: List[str] = (),
+            stderr_tail: List[str] = (),
+            timed_out: bool = False
+    ):
+        self.command = command
+        self.return_code = return_code
+        self.duration = duration
+        self.stdout = stdout
+        self.tail = list(tail)
+        self.stderr_tail = list(stderr_tail)
+        self.timed_out = timed_out
+
+    @property
+    def succeeded(self) -> bool:
+        return self.return_code == 0 and not self.timed_out
+
+    def __repr__(self) -> str:
+        return f"CommandResult({self.command!r}, return_code={self.return_code}, duration={self.duration:.2f})"
+
+
+def _kill_process(process: asyncio.subprocess.Process) -> None:
+    """
+    Kill a shell process and the commands it started.
+    """
+    if process.returncode is not None:
+        return
+
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
 
-    Examples
-    --------
-    >>> list_files('/path/to/directory')
-    ['/path/to/directory/file1.txt', '/path/to/directory/subdir/file2.txt', ...]
 
+async def _iterate_lines(stream: asyncio.StreamReader, chunk_size: int = 2 ** 16) -> AsyncIterator[bytes]:
     """
-    root_dir = Path(directory)
+    Iterate over the lines of a stream, read in chunks so lines of any length are supported, unlike
+    `StreamReader.readline`, which fails on lines longer than the stream limit.
+    """
+    buffer = bytearray()
+
+    while True:
+        chunk = await stream.read(chunk_size)
 
-    return [str(f) for f in root_dir.rglob('*') if f.is_file()]
+        if not chunk:
+            break
 
+        newline = chunk.rfind(b"\n")
 
-def copy_file(source_file: str, destination_file: str) -> None:
+        if newline < 0:
+            buffer += chunk
+            continue
+
+        buffer += chunk[:newline]
+
+        for line in buffer.split(b"\n"):
+            yield bytes(line)
+
+        buffer = bytearray(chunk[newline + 1:])
+
+    if buffer:
+        yield bytes(buffer)
+
+
+async def execute_command_async(
+        command: str,
+        timeout: float = None,
+        tail_lines: int = 50,
+        capture_output: bool = True,
+        allowed_errors: Iterable[str] = ()
+) -> CommandResult:
     """
-    Read a text file and copy its content to another file.
+    Execute a shell command, streaming its output and errors to logging line by line as they arrive.
+
+    The command runs in its own process group, which is killed when the timeout expires or the calling task is
+    cancelled.
 
     Parameters
     ----------
-    source_file : str
-        The path of the source text file to be read.
-    destination_file : str
-        The path of the destination file where the content will be copied.
+    command : str
+        The shell command to be executed.
+    timeout : float
+        Maximum execution time, in seconds. No limit by default.
+    tail_lines : int
+        Number of output lines kept in the result tail.
+    capture_output : bool
+        Keep the full stdout in the result. Disable it for long, verbose commands to bound memory usage.
+    allowed_errors : Iterable[str]
+        Expected error messages (stderr substrings): matching lines are logged at debug level instead of error.
+
+    Returns
+    -------
+    CommandResult
+        Command outcome.
 
     Examples
     --------
-    >>> copy_file('source.txt', 'destination.txt')
+    >>> result = asyncio.run(execute_command_async("echo hello", timeout=10))
+    >>> result.return_code, result.stdout
+    (0, 'hello')
     """
-    with open(source_file, 'r') as src:
-        content = src.read()
+    start_time = time.perf_counter()
+    stdout_lines = []
+    tail = deque(maxlen=tail_lines)
+    stderr_tail = deque(maxlen=tail_lines)
+
+    process = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=(os.name == "posix")
+    )
+
+    async def read_stream(stream: asyncio.StreamReader, log, lines: deque) -> None:
+        async for raw_line in _iterate_lines(stream):
+            line = raw_line.decode(errors="replace").rstrip("\r\n")
+
+            if lines is None and capture_output:
+                stdout_lines.append(line)
 
-    with open(destination_file, 'w') as dst:
-        dst.write(content)
+            line = line.strip()
 
+            if line:
+                log(line)
+                tail.append(line)
+
+                if lines is not None:
+                    lines.append(line)
+
+    allowed_errors = tuple(allowed_errors)
+
+    def log_error(line: str) -> None:
+        if any(error in line for error in allowed_errors):
+            logging.debug(line)
+        else:
+            logging.error(line)
 
-def execute_command(command) -> str:
+    readers = asyncio.gather(
+        read_stream(process.stdout, logging.debug, None),
+        read_stream(process.stderr, log_error, stderr_tail)
+    )
+    timed_out = False
+
+    try:
+        await asyncio.wait_for(asyncio.shield(readers), timeout)
+        await process.wait()
+    except asyncio.TimeoutError:
+        logging.error(f"Command timed out after {timeout} seconds: {command}")
+        timed_out = True
+        _kill_process(process)
+        await readers
+        await process.wait()
+    except asyncio.CancelledError:
+        _kill_process(process)
+        readers.cancel()
+
+        try:
+            await readers
+        except asyncio.CancelledError:
+            pass
+
+        raise
+    except Exception:
+        # A failed reader must not leave the command running
+        _kill_process(process)
+        await process.wait()
+        raise
+
+    return CommandResult(
+        command,
+        process.returncode,
+        time.perf_counter() - start_time,
+        stdout="\n".join(stdout_lines).strip(),
+        tail=tail,
+        stderr_tail=stderr_tail,
+        timed_out=timed_out
+    )
+
+
+def execute_command(command, check: bool = False, timeout: float = None, allowed_errors: Iterable[str] = ()) -> str:
     """
     Execute a shell command and log its output and errors.
 
@@ -106,57 +271,70 @@ def execute_command(command) -> str:
     ----------
     command : str
         The shell command to be executed.
+    check : bool
+        Raise an error if the command exits with a non-zero code.
+    timeout : float
+        Maximum execution time, in seconds. No limit by default.
+    allowed_errors : Iterable[str]
+        Expected error messages (stderr substrings), logged at debug level instead of error.
 
     Returns
     -------
     str
         The combined output (stdout) of the command.
-    """
-    # Start the subprocess
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-    # Capture stdout and stderr
-    stdout, stderr = process.communicate()
-
-    # Log stdout line by line
-    for line in stdout.splitlines():
-        line = line.strip()
 
-        if line:
-            logging.debug(line)
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If `check` is set and the command fails.
+    subprocess.TimeoutExpired
+        If `check` is set and the command times out.
+    """
+    result = asyncio.run(execute_command_async(command, timeout=timeout, allowed_errors=allowed_errors))
 
-    # Log stderr line by line
-    for line in stderr.splitlines():
-        line = line.strip()
+    if check and result.timed_out:
+        raise subprocess.TimeoutExpired(command, timeout, output=result.stdout, stderr="\n".join(result.stderr_tail))
 
-        if line:
-            logging.error(line)
+    if check and result.return_code != 0:
+        raise subprocess.CalledProcessError(
+            result.return_code, command, output=result.stdout, stderr="\n".join(result.stderr_tail)
+        )
 
     # Return the combined stdout content
-    return stdout.strip()
+    return result.stdout
 
 
-def create_temp_file(extension: str) -> str:
+def write_if_changed(filepath: Union[str, os.PathLike], content: str) -> bool:
     """
-    Create a temporary file with a specified extension.
+    Write a text file only if its content differs, leaving unchanged files (and their mtimes) untouched.
 
     Parameters
     ----------
-    extension : str
-        The file extension (including the dot, e.g., '.txt').
+    filepath : Union[str, os.PathLike]
+        The path of the file to be written.
+    content : str
+        The file content.
 
     Returns
     -------
-    str
-        The path to the created temporary file.
+    bool
+        True if the file was written, False if it already had the same content.
     """
-    # Create a temporary file with a unique name
-    temp_file = tempfile.NamedTemporaryFile(suffix=extension, delete=False)
+    data = content.encode()
+
+    try:
+        with open(filepath, mode="rb") as file:
+            if file.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    target_dir = os.path.dirname(filepath)
 
-    # Get the file path
-    temp_file_path = temp_file.name
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
 
-    # Close the file as we don't need it open
-    temp_file.close()
+    with open(filepath, mode="wb") as file:
+        file.write(data)
 
-    return temp_file_path
+    return True